@@ -0,0 +1,58 @@
+"""
+Import-time profile of the bot, from `python -X importtime`.
+
+    python bench/bench_imports.py [--top 20] [--modules bot cogs.admin ...]
+
+Imports the given modules in a fresh interpreter and reports the total, the
+slowest modules by self time, and cumulative time per top-level package.
+The default modules are what a restart imports before setup_hook finishes.
+Run it before and after touching imports to keep time-to-ready low.
+"""
+import argparse
+import collections
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_MODULES = ["bot", "cogs.admin", "cogs.listener", "cogs.expiry"]
+
+def profile(modules):
+    """[(self_us, cumulative_us, depth, name)] for every module imported."""
+    code = "; ".join(f"import {m}" for m in modules)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((int(self_us), int(cumulative), depth, name.strip()))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modules", nargs="+", default=DEFAULT_MODULES)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    rows = profile(args.modules)
+    total = sum(self_us for self_us, *_ in rows)
+    print(f"{len(rows)} modules imported in {total / 1000:.1f} ms\n")
+
+    print(f"{'slowest (self)':<44}{'self ms':>9}{'cum ms':>9}")
+    for self_us, cumulative, _, name in sorted(rows, reverse=True)[: args.top]:
+        print(f"{name:<44}{self_us / 1000:>9.1f}{cumulative / 1000:>9.1f}")
+
+    by_package = collections.Counter()
+    for self_us, _, _, name in rows:
+        by_package[name.partition(".")[0]] += self_us
+    print(f"\n{'by package':<44}{'ms':>9}{'share':>9}")
+    for package, self_us in by_package.most_common(args.top):
+        print(f"{package:<44}{self_us / 1000:>9.1f}{self_us / total:>9.0%}")
+
+if __name__ == "__main__":
+    main()
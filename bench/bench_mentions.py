@@ -0,0 +1,64 @@
+"""
+Micro-benchmark for the on_message mention check.
+
+    python bench/bench_mentions.py [-n 200000]
+
+Compares the old per-listener checks (substring tests plus two regexes,
+one run twice) with mentions.scan_message on messages that don't ping,
+in slot and non-slot channels.
+"""
+import argparse
+import os
+import re
+import sys
+import timeit
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database as db
+from mentions import scan_message
+
+HERE_PATTERN = re.compile(r'@here', re.IGNORECASE)
+EVERY_PATTERN = re.compile(r'@everyone', re.IGNORECASE)
+
+SLOT_CHANNEL = 1
+OTHER_CHANNEL = 2
+TEXT = "selling 2x nitro codes, dm me for prices — fast delivery, vouches in #proofs " * 2
+
+def fake_message(channel_id, content=TEXT):
+    return SimpleNamespace(
+        channel=SimpleNamespace(id=channel_id),
+        content=content,
+        mention_everyone=False,
+    )
+
+def old_check(message):
+    # bot.on_message
+    content = message.content
+    "@everyone" in content
+    "@here" in content
+    # PingListener.on_message
+    if not (HERE_PATTERN.search(content) or EVERY_PATTERN.search(content)):
+        return None
+    return EVERY_PATTERN.search(content)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=200_000)
+    args = parser.parse_args()
+
+    db.registry.put(db.SlotRecord(1, 1, SLOT_CHANNEL, 1, "slot", None, None))
+    cases = {
+        "slot channel, no ping": fake_message(SLOT_CHANNEL),
+        "slot channel, stray @": fake_message(SLOT_CHANNEL, TEXT + " email me @ shop"),
+        "other channel": fake_message(OTHER_CHANNEL),
+    }
+    print(f"{'case':<24}{'old ns/msg':>12}{'new ns/msg':>12}")
+    for name, msg in cases.items():
+        old = timeit.timeit(lambda: old_check(msg), number=args.n) / args.n * 1e9
+        new = timeit.timeit(lambda: scan_message(msg), number=args.n) / args.n * 1e9
+        print(f"{name:<24}{old:>12.0f}{new:>12.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Startup benchmark: time-to-ready and peak RSS per gateway profile.
+
+    TOKEN=... python bench/bench_startup.py [--profiles slim full]
+
+Each profile runs in a fresh interpreter that imports bot.py with
+INTENTS_PROFILE set, logs in, waits for on_ready and exits. Needs a real bot token.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def child():
+    import resource
+    sys.path.insert(0, ROOT)
+    started = time.perf_counter()
+    import bot as bot_module
+    bot = bot_module.bot
+
+    @bot.listen()
+    async def on_ready():
+        ready = time.perf_counter() - started
+        rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        members = sum(len(g.members) for g in bot.guilds)
+        print(json.dumps({"ready_s": ready, "rss_mb": rss_kb / 1024, "cached_members": members}))
+        await bot.close()
+
+    bot.run(os.environ["TOKEN"], log_handler=None)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--profiles", nargs="+", default=["slim", "full"])
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child()
+    if not os.getenv("TOKEN"):
+        sys.exit("set TOKEN to a bot token first")
+
+    print(f"{'profile':<8}{'ready (s)':>12}{'RSS (MB)':>12}{'members':>10}")
+    for profile in args.profiles:
+        env = dict(os.environ, INTENTS_PROFILE=profile)
+        out = subprocess.run(
+            [sys.executable, __file__, "--child"], env=env, cwd=ROOT,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip().splitlines()[-1]
+        result = json.loads(out)
+        print(f"{profile:<8}{result['ready_s']:>12.2f}{result['rss_mb']:>12.1f}{result['cached_members']:>10}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Minimal stand-ins for the discord.py objects the cogs touch, so the bot's
+hot paths can run without a gateway connection. Every REST-shaped method
+goes through FakeHTTP, which sleeps for a configurable latency and counts
+calls per route.
+"""
+import asyncio
+import itertools
+from collections import Counter
+from types import SimpleNamespace
+
+_ids = itertools.count(1_100_000_000_000_000_000)
+
+def next_id():
+    return next(_ids)
+
+class FakeHTTP:
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = Counter()
+
+    async def request(self, route):
+        self.calls[route] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+class FakeRole:
+    def __init__(self, guild, role_id=None, name="@everyone"):
+        self.id = role_id or next_id()
+        self.guild = guild
+        self.name = name
+
+class FakeMember:
+    def __init__(self, guild, member_id=None, bot=False, admin=False):
+        self.id = member_id or next_id()
+        self.guild = guild
+        self.bot = bot
+        self.roles = []
+        self.mention = f"<@{self.id}>"
+        self.guild_permissions = SimpleNamespace(administrator=admin)
+
+    async def send(self, *args, **kwargs):
+        await self.guild.http.request("dm")
+
+    def __str__(self):
+        return f"member-{self.id}"
+
+class FakeTextChannel:
+    def __init__(self, guild, name, category=None, channel_id=None):
+        self.id = channel_id or next_id()
+        self.guild = guild
+        self.name = name
+        self.category = category
+        self.category_id = category.id if category else None
+        self.mention = f"<#{self.id}>"
+        self.overwrites = {}
+
+    async def send(self, *args, **kwargs):
+        await self.guild.http.request("message")
+        return FakeMessage(self, self.guild.me, args[0] if args else "")
+
+    async def set_permissions(self, target, *, overwrite=None, reason=None, **perms):
+        await self.guild.http.request("permissions")
+        self.overwrites[target] = overwrite or perms
+
+    async def delete(self, reason=None):
+        await self.guild.http.request("channel_delete")
+        self.guild.channels.pop(self.id, None)
+
+    async def delete_messages(self, messages, reason=None):
+        await self.guild.http.request("bulk_delete")
+
+class FakeGuild:
+    def __init__(self, http: FakeHTTP, guild_id=None):
+        self.id = guild_id or next_id()
+        self.http = http
+        self.channels: dict[int, FakeTextChannel] = {}
+        self.members: dict[int, FakeMember] = {}
+        self.roles: dict[int, FakeRole] = {}
+        self.default_role = FakeRole(self, self.id)
+        self.me = self.add_member(bot=True)
+
+    def add_member(self, **kwargs):
+        member = FakeMember(self, **kwargs)
+        self.members[member.id] = member
+        return member
+
+    def add_channel(self, name, category=None):
+        channel = FakeTextChannel(self, name, category)
+        self.channels[channel.id] = channel
+        return channel
+
+    def get_channel(self, channel_id):
+        return self.channels.get(channel_id)
+
+    def get_member(self, member_id):
+        return self.members.get(member_id)
+
+    def get_role(self, role_id):
+        return self.roles.get(role_id)
+
+    async def fetch_member(self, member_id):
+        await self.http.request("member")
+        return self.members[member_id]
+
+    async def create_text_channel(self, name, *, category=None, overwrites=None):
+        await self.http.request("channel_create")
+        channel = self.add_channel(name, category)
+        channel.overwrites = dict(overwrites or {})
+        return channel
+
+class FakeMessage:
+    def __init__(self, channel, author, content):
+        self.id = next_id()
+        self.channel = channel
+        self.guild = channel.guild
+        self.author = author
+        self.content = content
+        self.mention_everyone = False
+
+    async def delete(self):
+        await self.guild.http.request("message_delete")
+
+    async def edit(self, content=None, **kwargs):
+        await self.guild.http.request("message_edit")
+        self.content = content
+
+class FakeContext:
+    """Just enough of commands.Context for calling AdminCog commands directly."""
+
+    def __init__(self, bot, guild, channel, author):
+        self.bot = bot
+        self.guild = guild
+        self.channel = channel
+        self.author = author
+
+    async def send(self, *args, **kwargs):
+        return await self.channel.send(*args, **kwargs)
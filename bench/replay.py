@@ -0,0 +1,223 @@
+"""
+Offline benchmark: replays synthetic traffic through the real bot code
+against fake Discord objects (bench/fakes.py) and a throwaway SQLite file.
+
+    python bench/replay.py --messages 20000 --slots 500 --here-ratio 0.05
+    python bench/replay.py --rate 2000 --http-latency 0.05
+
+Phases:
+  db        database.py helpers called directly
+  messages  bot.on_message (router -> PingListener) for a mixed stream,
+            which only queues pings; PingListener._enforce then times the
+            deferred burst enforcement (counts, edits, deletes, revokes)
+  commands  AdminCog.create_slot / transfer_slot
+
+Reports throughput, p50/p99 latency and, for the message path, memory
+blocks retained and peak traced memory per message.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import database as db
+import dispatcher
+from fakes import FakeContext, FakeGuild, FakeHTTP, FakeMessage
+from sessions import sessions
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def report(name, samples, elapsed):
+    print(
+        f"{name:<22}{len(samples):>9}{len(samples) / elapsed:>12.0f}"
+        f"{percentile(samples, 50) * 1e6:>10.0f}{percentile(samples, 99) * 1e6:>10.0f}"
+    )
+
+async def timed_calls(calls):
+    samples = []
+    start = time.perf_counter()
+    for call in calls:
+        t = time.perf_counter()
+        await call()
+        samples.append(time.perf_counter() - t)
+    return samples, time.perf_counter() - start
+
+# ─── PHASES ───────────────────────────────────────────────────────────────
+async def bench_db(guild, n):
+    ids = [channel_id for channel_id in range(10**12, 10**12 + n)]
+    owner = guild.me.id
+    for name, make in (
+        ("db.add_slot", lambda cid: lambda: db.add_slot(guild.id, cid, owner, "bench", 30)),
+        ("db.get_slot_by_channel", lambda cid: lambda: db.get_slot_by_channel(cid)),
+        ("db.bump_ping", lambda cid: lambda: db.bump_ping(cid)),
+        ("db.update_slot_owner", lambda cid: lambda: db.update_slot_owner(cid, owner + 1)),
+        ("db.remove_slot", lambda cid: lambda: db.remove_slot(cid)),
+    ):
+        report(name, *await timed_calls([make(cid) for cid in ids]))
+
+def build_traffic(guild, slots, others, members, args, rng):
+    traffic = []
+    for _ in range(args.messages):
+        if rng.random() < args.slot_ratio:
+            channel, owner = rng.choice(slots)
+            content = "restock live now, check the pinned list"
+            if rng.random() < args.here_ratio:
+                content = "@here " + content
+            traffic.append(FakeMessage(channel, owner, content))
+        else:
+            traffic.append(FakeMessage(rng.choice(others), rng.choice(members), "anyone got a middleman?"))
+    return traffic
+
+async def bench_messages(on_message, traffic, rate):
+    samples = []
+    start = time.perf_counter()
+    if rate <= 0:
+        for msg in traffic:
+            t = time.perf_counter()
+            await on_message(msg)
+            samples.append(time.perf_counter() - t)
+    else:
+        # open loop: messages arrive on schedule whether or not earlier ones finished
+        async def one(msg, due):
+            await on_message(msg)
+            samples.append(time.perf_counter() - due)
+        tasks = []
+        for i, msg in enumerate(traffic):
+            due = start + i / rate
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(one(msg, due)))
+        await asyncio.gather(*tasks)
+    report("bot.on_message", samples, time.perf_counter() - start)
+
+def time_enforcement(listener):
+    """Record how long each of PingListener's burst enforcements takes."""
+    samples = []
+    enforce = listener._enforce
+    async def timed(channel, burst):
+        t = time.perf_counter()
+        try:
+            return await enforce(channel, burst)
+        finally:
+            samples.append(time.perf_counter() - t)
+    listener._enforce = timed
+    return samples
+
+async def settle(bot):
+    """Wait until PingListener has enforced every queued ping burst."""
+    drainers = bot.get_cog("PingListener")._drainers
+    while drainers:
+        await asyncio.gather(*drainers.values())
+
+async def measure_allocations(on_message, traffic):
+    sample = traffic[: min(len(traffic), 2000)]
+    before = sys.getallocatedblocks()
+    tracemalloc.start()
+    for msg in sample:
+        await on_message(msg)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    retained = sys.getallocatedblocks() - before
+    print(f"  retained blocks/msg: {retained / len(sample):.2f}   peak traced: {peak / 1024:.0f} KiB over {len(sample)} msgs")
+
+async def bench_commands(bot, guild, n, rng):
+    admin_cog = bot.get_cog("AdminCog")
+    admin = guild.add_member(admin=True)
+    command_channel = guild.add_channel("staff-commands")
+    members = [guild.add_member() for _ in range(n)]
+
+    # answer every prompt at once with a slot name
+    async def ask(user_id, channel_id, timeout):
+        return FakeMessage(command_channel, admin, f"new-slot-{rng.randrange(10**6)}")
+    sessions.ask = ask
+
+    ctx = FakeContext(bot, guild, command_channel, admin)
+    create_calls = [lambda m=m: admin_cog.create_slot(ctx, m, 7) for m in members]
+    report("AdminCog.create_slot", *await timed_calls(create_calls))
+
+    created = [rec for rec in db.registry.for_guild(guild.id) if rec.name.startswith("new-slot-")]
+    transfer_calls = []
+    for rec in created:
+        tctx = FakeContext(bot, guild, guild.get_channel(rec.channel_id), admin)
+        transfer_calls.append(lambda c=tctx: admin_cog.transfer_slot(c, rng.choice(members)))
+    report("AdminCog.transfer_slot", *await timed_calls(transfer_calls))
+
+# ─── MAIN ─────────────────────────────────────────────────────────────────
+async def run(args):
+    rng = random.Random(args.seed)
+    if not args.rate_limits:
+        # measure our own code, not the dispatcher's deliberate pacing
+        unlimited = (10**9, 1.0)
+        dispatcher.ROUTE_LIMITS = dict.fromkeys(dispatcher.ROUTE_LIMITS, unlimited)
+        dispatcher.DEFAULT_LIMIT = unlimited
+    tmp = tempfile.TemporaryDirectory()
+    db.DB_FILE = os.path.join(tmp.name, "bench.db")
+
+    import bot as bot_module
+    import cogs.listener
+    cogs.listener.BURST_WINDOW = args.burst_window
+    bot = bot_module.bot
+    await db.init_db()
+    for ext in ("cogs.admin", "cogs.listener"):
+        await bot.load_extension(ext)
+    # never logged in, so there is no ready event for the decision sweeper
+    bot.get_cog("PingListener")._sweeper.cancel()
+
+    http = FakeHTTP(args.http_latency)
+    guild = FakeGuild(http)
+    members = [guild.add_member() for _ in range(200)]
+    slots = []
+    for i in range(args.slots):
+        owner = guild.add_member()
+        channel = guild.add_channel(f"slot-{i}")
+        await db.add_slot(guild.id, channel.id, owner.id, channel.name, 30)
+        slots.append((channel, owner))
+    others = [guild.add_channel(f"general-{i}") for i in range(20)]
+
+    print(f"{'phase':<22}{'ops':>9}{'ops/s':>12}{'p50 µs':>10}{'p99 µs':>10}")
+    await bench_db(guild, args.db_ops)
+    traffic = build_traffic(guild, slots, others, members, args, rng)
+    enforce_samples = time_enforcement(bot.get_cog("PingListener"))
+    start = time.perf_counter()
+    await bench_messages(bot_module.on_message, traffic, args.rate)
+    await settle(bot)
+    if enforce_samples:
+        # elapsed includes the burst windows spent waiting, so ops/s is a floor
+        report("PingListener._enforce", enforce_samples, time.perf_counter() - start)
+    await measure_allocations(bot_module.on_message, traffic)
+    await settle(bot)
+    await bench_commands(bot, guild, args.commands, rng)
+
+    print("fake REST calls:", dict(http.calls))
+    print("registry:", db.registry.stats(), " router:", bot.router.stats())
+    await db.close_db()
+    tmp.cleanup()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=20_000)
+    parser.add_argument("--slots", type=int, default=500)
+    parser.add_argument("--slot-ratio", type=float, default=0.3, help="share of messages sent in slot channels")
+    parser.add_argument("--here-ratio", type=float, default=0.05, help="share of slot messages carrying @here")
+    parser.add_argument("--rate", type=float, default=0, help="messages/s, open loop (0 = back to back)")
+    parser.add_argument("--http-latency", type=float, default=0.0, help="seconds per fake REST call")
+    parser.add_argument("--rate-limits", action="store_true", help="keep the dispatcher's Discord route limits")
+    parser.add_argument("--burst-window", type=float, default=0.05, help="PingListener.BURST_WINDOW in seconds")
+    parser.add_argument("--db-ops", type=int, default=2_000)
+    parser.add_argument("--commands", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
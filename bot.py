@@ -1,28 +1,97 @@
 import discord
-from discord.ext import commands, tasks
+from discord import app_commands
+from discord.ext import commands
 import asyncio
 import datetime
-import base64
-import random
+import logging
+import math
+import database as db
+import metrics
+from config import (
+    BOT_PREFIX, CATEGORY_ID, ADMIN_ROLE_ID, ADMIN_IDS, EXTENSIONS,
+    INTENTS_PROFILE, RECEIVES_DMS, SHARD_COUNT, SHARD_IDS, SYNC_APP_COMMANDS,
+)
+from overwrites import OverwriteTemplates
+import slotkeys
+from slotkeys import decode_key, InvalidKey
+from router import MessageRouter
+from reconcile import reconcile_guild
+from sessions import sessions
+
+log = logging.getLogger(__name__)
 
 # ─── CONFIG ────────────────────────────────────────────────────────────────
-BOT_PREFIX      = ","
-CATEGORY_ID     = 1375748081735172126
-ADMIN_ROLE_ID   = 1375747962487181342
-ADMIN_IDS       = {
-    993153549095673936,
-    1241446608424407052,
-    1083998643322892401,
-    981093886351003709
-}
-
-intents = discord.Intents.all()
-bot = commands.Bot(command_prefix=BOT_PREFIX, intents=intents, help_command=None)
-bot.remove_command("help")
+# Defaults and environment settings live in config.py.
+def guild_settings(guild_id: int) -> db.GuildConfig:
+    """A guild's effective settings: its guild_config row over the defaults above."""
+    cfg = db.get_guild_config(guild_id)
+    if cfg is None:
+        return db.GuildConfig(guild_id, CATEGORY_ID, ADMIN_ROLE_ID, ADMIN_IDS)
+    return db.GuildConfig(
+        guild_id,
+        cfg.category_id or CATEGORY_ID,
+        cfg.admin_role_id or ADMIN_ROLE_ID,
+        cfg.admin_ids if cfg.admin_ids is not None else ADMIN_IDS,
+    )
+
+# ─── SHARDING ─────────────────────────────────────────────────────────────
+def owns_guild(guild_id: int) -> bool:
+    if not SHARD_IDS:
+        return True
+    return (guild_id >> 22) % SHARD_COUNT in SHARD_IDS
+
+class SlotBot(commands.AutoShardedBot if SHARD_COUNT else commands.Bot):
+    _db_ready: asyncio.Task | None = None
+
+    async def login(self, token: str):
+        # open the DB while the login request is in flight
+        self._db_ready = asyncio.create_task(db.init_db(owns_guild))
+        await super().login(token)
+
+    async def setup_hook(self):
+        # runs at the end of login(); no events are dispatched until it returns
+        await asyncio.gather(self._db_ready or db.init_db(owns_guild), metrics.start_server())
+        # the cogs only need the registry in cog_load, so load them side by side
+        await asyncio.gather(*(self.load_extension(ext) for ext in EXTENSIONS))
+        if SYNC_APP_COMMANDS:
+            await self.tree.sync()
 
-# In-memory slot store:
-# { channel_id: { owner_id, created_at, expiration (datetime), pings (int) } }
-slots = {}
+    async def close(self):
+        await super().close()
+        await metrics.stop_server()
+        await db.close_db()
+
+# ─── GATEWAY PROFILE ──────────────────────────────────────────────────────
+# "slim" (default): only what the bot uses, no startup member chunking, and a
+# member cache holding just admins and slot owners (see warm_member_cache).
+# "full": every intent and the default member cache, as before.
+def build_intents(profile: str) -> discord.Intents:
+    if profile == "full":
+        return discord.Intents.all()
+    intents = discord.Intents.none()
+    intents.guilds = True           # channels, roles, role update events
+    intents.members = True          # member updates for admins, query_members
+    intents.guild_messages = True
+    intents.dm_messages = True      # ,Aslot key replies
+    intents.message_content = True  # prefix commands and @here checks
+    return intents
+
+intents = build_intents(INTENTS_PROFILE)
+# 429s asking for a longer wait than this (30 s at least) are raised as
+# RateLimited instead of slept on inside discord.py, so the dispatcher can
+# park the whole route and retry; shorter ones discord.py retries itself.
+options = {"max_ratelimit_timeout": 30.0}
+if INTENTS_PROFILE != "full":
+    options.update(member_cache_flags=discord.MemberCacheFlags.none(), chunk_guilds_at_startup=False)
+if SHARD_COUNT:
+    options.update(shard_count=SHARD_COUNT, shard_ids=SHARD_IDS)
+bot = SlotBot(command_prefix=BOT_PREFIX, intents=intents, help_command=None, **options)
+bot.remove_command("help")
+# Shared with the cogs
+bot.guild_settings = guild_settings
+bot.slot_overwrites = OverwriteTemplates(guild_settings)
+metrics.GATEWAY_LATENCY.func = lambda: bot.latency
+metrics.ACTIVE_SLOTS.func = lambda: len(db.registry)
 
 # ─── HELP COMMAND ─────────────────────────────────────────────────────────
 @bot.command(aliases=["h"])
@@ -33,7 +102,7 @@ async def help(ctx):
     )
     embed.add_field(
         name=",create",
-        value="Create a new slot (admins only).",
+        value="Create a new slot (admins only). `/create`, `/revoke` and `/transfer` skip the prompts.",
         inline=False
     )
     embed.add_field(
@@ -41,14 +110,44 @@ async def help(ctx):
         value="Revoke someone’s slot (admins only).",
         inline=False
     )
+    embed.add_field(
+        name=",bulkrevoke",
+        value="Revoke many slots at once by owner, age, expiry or category (admins only).",
+        inline=False
+    )
     embed.add_field(
         name=",transfer",
         value="Transfer your slot to another user.",
         inline=False
     )
+    embed.add_field(
+        name=",config",
+        value="Set this server’s slot category, admin role and admins (admins only).",
+        inline=False
+    )
+    embed.add_field(
+        name=",policy",
+        value="Show or set a slot’s @here/@everyone limits, rolling window and cooldown (admins only).",
+        inline=False
+    )
+    embed.add_field(
+        name=",history",
+        value="Slot audit log for the server, a member or a channel (admins only).",
+        inline=False
+    )
+    embed.add_field(
+        name=",export",
+        value="Download this server’s slots, pings, revokes or audit events as CSV/JSONL (admins only).",
+        inline=False
+    )
+    embed.add_field(
+        name=",stats",
+        value="Show message-routing and slot-cache counters (admins only).",
+        inline=False
+    )
     embed.add_field(
         name=",Aslot",
-        value="Restore your slot via your key.",
+        value="Restore your slot via your key (`,Aslot <key>`, answer the DM, or `/aslot`).",
         inline=False
     )
     await ctx.send(embed=embed)
@@ -56,46 +155,82 @@ async def help(ctx):
 # ─── UTILITIES ────────────────────────────────────────────────────────────
 def is_admin(member: discord.Member) -> bool:
     # By ID or by having the admin role
-    if member.id in ADMIN_IDS:
+    cfg = guild_settings(member.guild.id)
+    if member.id in cfg.admin_ids:
         return True
-    return any(r.id == ADMIN_ROLE_ID for r in member.roles)
+    return any(r.id == cfg.admin_role_id for r in member.roles)
 
-def encode_key(data: dict) -> str:
-    """
-    Base64‐encode a little pipe‐delimited blob:
-      owner_id|channel_name|expiration_iso|pings
-    """
-    raw = f"{data['owner_id']}|{data['channel_name']}|{data['expiration'].isoformat()}|{data['pings']}"
-    return base64.urlsafe_b64encode(raw.encode()).decode()
-
-def decode_key(key: str) -> dict:
-    raw = base64.urlsafe_b64decode(key.encode()).decode()
-    owner_id, channel_name, exp_iso, pings = raw.split("|")
-    return {
-        "owner_id":   int(owner_id),
-        "channel_name": channel_name,
-        "expiration": datetime.datetime.fromisoformat(exp_iso),
-        "pings":      int(pings)
-    }
-
-async def revoke_slot(channel: discord.TextChannel, reason: str):
-    info = slots.pop(channel.id, None)
-    # Delete the channel and DM the owner
-    await channel.delete(reason=reason)
-    if info:
-        guild = channel.guild
-        owner = guild.get_member(info["owner_id"])
-        if owner:
-            await owner.send(
-                embed=discord.Embed(
-                    description=f"❌ Your slot `{channel.name}` was revoked: {reason}",
-                    color=discord.Color.red()
-                )
-            )
+# ─── MEMBER CACHE ─────────────────────────────────────────────────────────
+async def warm_member_cache(guild: discord.Guild):
+    """Cache just the admins and slot owners of a guild (100 IDs per gateway request)."""
+    wanted = set(guild_settings(guild.id).admin_ids)
+    wanted.update(rec.owner_id for rec in db.registry.for_guild(guild.id))
+    wanted = [uid for uid in wanted if guild.get_member(uid) is None]
+    for i in range(0, len(wanted), 100):
+        await guild.query_members(user_ids=wanted[i:i + 100], limit=100, cache=True)
+    # admins may only now be resolvable
+    bot.slot_overwrites.invalidate(guild.id)
+
+@bot.listen()
+async def on_guild_available(guild: discord.Guild):
+    # commands and ping enforcement wait until slot rows match the channels
+    bot.router.hold(guild.id)
+    try:
+        await reconcile_guild(guild, guild_settings(guild.id).category_id)
+    except Exception:
+        log.exception("reconciliation failed for guild %s", guild.id)
+    finally:
+        bot.router.release(guild.id)
+    if INTENTS_PROFILE != "full":
+        await warm_member_cache(guild)
+
+# ─── OVERWRITE TEMPLATE INVALIDATION ─────────────────────────────────────
+@bot.listen()
+async def on_member_update(before: discord.Member, after: discord.Member):
+    if after.id in guild_settings(after.guild.id).admin_ids:
+        bot.slot_overwrites.invalidate(after.guild.id)
+
+@bot.listen()
+async def on_member_join(member: discord.Member):
+    if member.id in guild_settings(member.guild.id).admin_ids:
+        bot.slot_overwrites.invalidate(member.guild.id)
+
+@bot.listen()
+async def on_member_remove(member: discord.Member):
+    if member.id in guild_settings(member.guild.id).admin_ids:
+        bot.slot_overwrites.invalidate(member.guild.id)
+
+@bot.listen()
+async def on_guild_role_update(before: discord.Role, after: discord.Role):
+    if after.id == guild_settings(after.guild.id).admin_role_id:
+        bot.slot_overwrites.invalidate(after.guild.id)
+
+@bot.listen()
+async def on_guild_role_delete(role: discord.Role):
+    if role.id == guild_settings(role.guild.id).admin_role_id:
+        bot.slot_overwrites.invalidate(role.guild.id)
+
+@bot.listen()
+async def on_guild_join(guild: discord.Guild):
+    # a guild we left keeps its rows (see on_guild_remove); track them again
+    # before reconciling, or its slots would look unmanaged
+    bot.router.hold(guild.id)
+    try:
+        await db.load_guild(guild.id)
+    except Exception:
+        log.exception("could not load slots for guild %s", guild.id)
+    await on_guild_available(guild)
+
+@bot.listen()
+async def on_guild_remove(guild: discord.Guild):
+    # the rows stay in case the bot is re-added (see on_guild_join); just
+    # stop tracking them
+    db.registry.drop_guild(guild.id)
+    bot.slot_overwrites.invalidate(guild.id)
 
 # ─── ASLOT COMMAND ────────────────────────────────────────────────────────
 @bot.command()
-async def Aslot(ctx: commands.Context):
+async def Aslot(ctx: commands.Context, key: str | None = None):
     # Must be run in a server channel
     if ctx.guild is None:
         return await ctx.send(
@@ -105,15 +240,29 @@ async def Aslot(ctx: commands.Context):
             )
         )
 
-    # 1) Prompt in DM
-    try:
-        dm = await ctx.author.create_dm()
-        await dm.send(
+    if not slotkeys.enabled():
+        # refuse before the user pastes a key anywhere
+        return await ctx.send(embed=keys_disabled())
+
+    if key is None and not RECEIVES_DMS:
+        # the DM reply would go to the shard-0 process, never to this one
+        return await ctx.send(
             embed=discord.Embed(
-                description="🔑 Please enter your slot key to restore your slot:",
+                description="🔑 Use `/aslot` to enter your slot key privately, or `,Aslot <key>`.",
                 color=discord.Color.blue()
             )
         )
+
+    # 1) Prompt in DM
+    try:
+        dm = await ctx.author.create_dm()
+        if key is None:
+            await dm.send(
+                embed=discord.Embed(
+                    description="🔑 Please enter your slot key to restore your slot:",
+                    color=discord.Color.blue()
+                )
+            )
     except discord.Forbidden:
         return await ctx.send(
             embed=discord.Embed(
@@ -122,108 +271,119 @@ async def Aslot(ctx: commands.Context):
             )
         )
 
-    def check_dm(msg: discord.Message):
-        return (
-            msg.author == ctx.author
-            and isinstance(msg.channel, discord.DMChannel)
-        )
+    # 2) Wait for key, unless it was passed inline (`,Aslot <key>`)
+    if key is None:
+        try:
+            reply = await sessions.ask(ctx.author.id, dm.id, timeout=120)
+        except asyncio.TimeoutError:
+            return await dm.send(
+                embed=discord.Embed(
+                    description="⌛ You took too long to reply. Please try `,Aslot` again.",
+                    color=discord.Color.red()
+                )
+            )
+        key = reply.content
+    else:
+        # don't leave the key sitting in a server channel
+        try:
+            await ctx.message.delete()
+        except discord.HTTPException:
+            pass
 
-    # 2) Wait for key
+    embed = await restore_slot(ctx.guild, ctx.author, key)
     try:
-        reply = await bot.wait_for("message", check=check_dm, timeout=120)
-    except asyncio.TimeoutError:
-        return await dm.send(
-            embed=discord.Embed(
-                description="⌛ You took too long to reply. Please try `,Aslot` again.",
-                color=discord.Color.red()
-            )
-        )
+        await dm.send(embed=embed)
+    except discord.Forbidden:
+        # inline keys never needed the DM; answer where the command was run
+        await ctx.send(ctx.author.mention, embed=embed)
+
+def keys_disabled() -> discord.Embed:
+    """Answer for restores while SLOT_KEY_SECRET is unset: no key can be trusted."""
+    log.warning("slot key restore refused: SLOT_KEY_SECRET is not set")
+    return discord.Embed(
+        description="⚠️ Slot keys are disabled on this bot. Please contact staff.",
+        color=discord.Color.red()
+    )
+
+async def restore_slot(guild: discord.Guild, member: discord.Member, key: str) -> discord.Embed:
+    """
+    Validate a slot key and re-create its channel for `member`. Returns the
+    embed to answer with: a confirmation, or why the key was refused.
+    """
+    if not slotkeys.enabled():
+        return keys_disabled()
 
-    # 3) Decode & validate
+    # 3) Decode & validate (signature check only, no DB round trip)
     try:
-        data = decode_key(reply.content.strip())
-    except Exception:
-        return await dm.send(
-            embed=discord.Embed(
-                description="❌ Invalid key format.",
-                color=discord.Color.red()
-            )
+        data = decode_key(key.strip())
+    except InvalidKey:
+        return discord.Embed(
+            description="❌ Invalid key format.",
+            color=discord.Color.red()
         )
 
-    if data["owner_id"] != ctx.author.id:
-        return await dm.send(
-            embed=discord.Embed(
-                description="🚫 That key does not belong to you.",
-                color=discord.Color.red()
-            )
+    if data["owner_id"] != member.id:
+        return discord.Embed(
+            description="🚫 That key does not belong to you.",
+            color=discord.Color.red()
+        )
+
+    if data["key_id"] in db.revoked_keys:
+        return discord.Embed(
+            description="🚫 That key has already been used or was revoked.",
+            color=discord.Color.red()
         )
 
     if datetime.datetime.utcnow() > data["expiration"]:
-        return await dm.send(
-            embed=discord.Embed(
-                description="⏰ Your slot key has expired.",
-                color=discord.Color.red()
-            )
+        return discord.Embed(
+            description="⏰ Your slot key has expired.",
+            color=discord.Color.red()
         )
 
+    # keys are single-use: burn it before the channel exists so a second
+    # paste of the same key can't race this one
+    await db.revoke_key(data["key_id"])
+
     # 4) Re-create the channel under the original category
-    category = ctx.guild.get_channel(CATEGORY_ID)
-    overwrites = {
-        ctx.guild.default_role: discord.PermissionOverwrite(
-            view_channel=True,
-            send_messages=False,
-            mention_everyone=False
-        ),
-        ctx.author: discord.PermissionOverwrite(
-            view_channel=True,
-            send_messages=True,
-            mention_everyone=True
-        ),
-    }
-    # admins by ID
-    for aid in ADMIN_IDS:
-        m = ctx.guild.get_member(aid)
-        if m:
-            overwrites[m] = discord.PermissionOverwrite(
-                view_channel=True,
-                send_messages=True,
-                mention_everyone=True
-            )
-    # admin role
-    ar = ctx.guild.get_role(ADMIN_ROLE_ID)
-    if ar:
-        overwrites[ar] = discord.PermissionOverwrite(
-            view_channel=True,
-            send_messages=True,
-            mention_everyone=True
-        )
+    category = guild.get_channel(guild_settings(guild.id).category_id)
+    overwrites = bot.slot_overwrites.for_owner(guild, member)
 
-    channel = await ctx.guild.create_text_channel(
-        name=data["channel_name"],
-        category=category,
-        overwrites=overwrites
-    )
+    try:
+        channel = await guild.create_text_channel(
+            name=data["channel_name"],
+            category=category,
+            overwrites=overwrites
+        )
+    except discord.HTTPException:
+        # nothing was restored, so the key must still work
+        await db.unrevoke_key(data["key_id"])
+        log.exception("could not re-create slot %r for %s", data["channel_name"], member.id)
+        return discord.Embed(
+            description="❌ I couldn’t create your slot channel. Your key is still valid; please try again.",
+            color=discord.Color.red()
+        )
 
-    # 5) Store it back in memory
-    slots[channel.id] = {
-        "owner_id":   data["owner_id"],
-        "created_at": datetime.datetime.utcnow(),
-        "expiration": data["expiration"],
-        "pings":      data["pings"]
-    }
+    # 5) Store it back in the slots table (and registry)
+    remaining = data["expiration"] - datetime.datetime.utcnow()
+    days = max(1, math.ceil(remaining.total_seconds() / 86400))
+    await db.add_slot(guild.id, channel.id, data["owner_id"], data["channel_name"], days)
+    db.log_event("restore", guild.id, channel.id, member.id, member.id, f"key {data['key_id']}")
+    # carry today's @here usage over so a restore doesn't reset the limit
+    if data["pings"]:
+        await db.seed_pings(channel.id, data["pings"])
 
     # 6) Send the rules/info embed in the new channel
     rules_text = (
         "• No @everyone pings allowed — will revoke immediately.\n"
-        "• Max 2 @here pings per day.\n"
-        "• 3rd @here ping will revoke the slot.\n"
+        f"• Max {db.DEFAULT_POLICY.here_limit} @here pings per day.\n"
+        "• Going over the @here limit will revoke the slot.\n"
         "• Only slot owner & staff can send here.\n"
         "• Slots auto-delete after expiry.\n"
         "• Be respectful & follow server rules."
     )
     info_text = (
-        f"**Owner:** {ctx.author.mention}\n"
-        f"**UserID:** {ctx.author.id}\n"
+        f"**Owner:** {member.mention}\n"
+        f"**UserID:** {member.id}\n"
         f"**Expires:** <t:{int(data['expiration'].timestamp())}:R>"
     )
     embed = discord.Embed(
@@ -233,59 +393,51 @@ async def Aslot(ctx: commands.Context):
     ).add_field(name="Slot Info", value=info_text)
     await channel.send(embed=embed)
 
-    # 7) Confirm in DM
-    await dm.send(
-        embed=discord.Embed(
-            description=f"🎉 Your slot has been restored: {channel.mention}",
-            color=discord.Color.green()
-        )
+    # 7) Confirmation for the caller to send
+    return discord.Embed(
+        description=f"🎉 Your slot has been restored: {channel.mention}",
+        color=discord.Color.green()
     )
 
-# ─── PING MANAGEMENT ──────────────────────────────────────────────────────
-@bot.event
-async def on_message(message: discord.Message):
-    # allow commands to still run
-    await bot.process_commands(message)
+class SlotKeyModal(discord.ui.Modal, title="Restore your slot"):
+    """`/aslot`: the key is typed into a modal, so it never lands in a channel or DM."""
+    key = discord.ui.TextInput(label="Slot key", style=discord.TextStyle.paragraph, max_length=400)
 
-    if message.author.bot:
-        return
+    async def on_submit(self, interaction: discord.Interaction):
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        embed = await restore_slot(interaction.guild, interaction.user, self.key.value)
+        await interaction.followup.send(embed=embed, ephemeral=True)
 
-    ch = message.channel
-    if not isinstance(ch, discord.TextChannel):
-        return
-    info = slots.get(ch.id)
-    if not info:
-        return
+@bot.tree.command(name="aslot", description="Restore your slot with your slot key")
+@app_commands.guild_only()
+async def aslot_slash(interaction: discord.Interaction):
+    await interaction.response.send_modal(SlotKeyModal())
 
-    content = message.content
+# ─── MESSAGE ROUTING ──────────────────────────────────────────────────────
+# One routing stage instead of process_commands + a separate listener:
+# commands for prefix messages, PingListener for slot channels, drop the rest.
+bot.router = MessageRouter(bot, BOT_PREFIX)
 
-    # 1) @everyone instantly revokes
-    if "@everyone" in content:
-        return await revoke_slot(ch, "Used @everyone ping")
-
-    # 2) @here counting
-    if "@here" in content:
-        info["pings"] += 1
-        cnt = info["pings"]
-
-        if cnt > 2:
-            return await revoke_slot(ch, "Exceeded @here pings")
+@bot.event
+async def on_message(message: discord.Message):
+    await bot.router.route(message)
 
-        # show 1/2 or 2/2
-        await ch.send(
-            embed=discord.Embed(
-                description=f"🔔 Ping {cnt}/2",
-                color=discord.Color.blue()
-            )
-        )
-        # warn on the 2nd ping
-        if cnt == 2:
-            await message.author.send(
-                embed=discord.Embed(
-                    description="⚠️ You have reached your 2/2 daily @here ping limit.",
-                    color=discord.Color.orange()
-                )
-            )
+@bot.command()
+@commands.guild_only()
+async def stats(ctx: commands.Context):
+    """Router and slot-registry counters (admins only)."""
+    if not is_admin(ctx.author):
+        return
+    embed = discord.Embed(title="📊 Bot stats", color=discord.Color.blue())
+    for stage, counts in bot.router.stats().items():
+        embed.add_field(name=stage, value=f"seen {counts['seen']} · dropped {counts['dropped']}")
+    reg = db.registry.stats()
+    embed.add_field(
+        name="registry",
+        value=f"{reg['slots']} slots · {reg['hits']} hits · {reg['misses']} misses",
+        inline=False
+    )
+    await ctx.send(embed=embed)
 
 # ─── BOT START ───────────────────────────────────────────────────────────
 if __name__ == "__main__":
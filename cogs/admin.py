@@ -1,18 +1,102 @@
 import asyncio
+import datetime
+import logging
+import re
+import time
 import discord
+from discord import app_commands
 from discord.ext import commands
 import database as db
+import metrics
+import policies
+from dispatcher import actions, resolve_member
+from overwrites import OWNER_OVERWRITE
+from sessions import sessions
 from random import randint
 
-# Load owner and category IDs from environment if needed
-OWNER_IDS = [int(i) for i in os.getenv("OWNER_IDS", "").split(",") if i]
-CATEGORY_ID = int(os.getenv("CATEGORY_ID", "0"))
+log = logging.getLogger(__name__)
 
 # Helper for random embed colour
 rand_colour = lambda: int(f"0x{randint(0, 0xFFFFFF):06x}", 16)
 
+# Edit the bulk-revoke progress message at most this often (seconds)
+PROGRESS_EVERY = 2.0
+
+class BulkRevokeFlags(commands.FlagConverter):
+    """`,bulkrevoke owner: @user older: 30 expired: yes category: 123 reason: ... confirm: yes`"""
+    owner: discord.Member | None = None
+    older: int | None = None      # created at least this many days ago
+    expired: bool = False
+    category: discord.CategoryChannel | None = None
+    reason: str = "Bulk revoke"
+    confirm: bool = False
+
+class GuildConfigFlags(commands.FlagConverter):
+    """`,config category: <id> role: @role admins: @a @b`"""
+    category: discord.CategoryChannel | None = None
+    role: discord.Role | None = None
+    admins: str | None = None
+
+class PolicyFlags(commands.FlagConverter):
+    """`,policy #slot here: 3 everyone: 1 window: 24h cooldown: 10m` (window: day = calendar day)"""
+    here: commands.Range[int, 0, 100] | None = None
+    everyone: commands.Range[int, 0, 100] | None = None
+    window: str | None = None
+    cooldown: str | None = None
+    reset: bool = False
+
+# Events per ,history page
+HISTORY_PAGE = 10
+
+class HistoryView(discord.ui.View):
+    """Older/Newer buttons for ,history; pages are fetched by id, never by offset."""
+
+    def __init__(self, author_id, fetch):
+        super().__init__(timeout=120)
+        self.author_id = author_id
+        self.fetch = fetch          # async (before_id) -> list[SlotEvent]
+        self.cursors = [None]       # before_id of each page shown so far
+        self.events = []
+
+    async def load(self):
+        self.events = await self.fetch(self.cursors[-1])
+        self.newer.disabled = len(self.cursors) == 1
+        self.older.disabled = len(self.events) < HISTORY_PAGE
+        return self.render()
+
+    def render(self):
+        embed = discord.Embed(title="📜 Slot history", colour=rand_colour())
+        lines = []
+        for ev in self.events:
+            line = f"<t:{int(ev.at.replace(tzinfo=datetime.timezone.utc).timestamp())}:f> **{ev.kind}**"
+            if ev.channel_id:
+                line += f" <#{ev.channel_id}>"
+            if ev.user_id:
+                line += f" <@{ev.user_id}>"
+            if ev.actor_id and ev.actor_id != ev.user_id:
+                line += f" by <@{ev.actor_id}>"
+            if ev.detail:
+                line += f" — {ev.detail}"
+            lines.append(line)
+        embed.description = "\n".join(lines) or "No events."
+        embed.set_footer(text=f"Page {len(self.cursors)}")
+        return embed
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return interaction.user.id == self.author_id
+
+    @discord.ui.button(label="◀ Newer", style=discord.ButtonStyle.grey)
+    async def newer(self, interaction, button):
+        self.cursors.pop()
+        await interaction.response.edit_message(embed=await self.load(), view=self)
+
+    @discord.ui.button(label="Older ▶", style=discord.ButtonStyle.grey)
+    async def older(self, interaction, button):
+        self.cursors.append(self.events[-1].id)
+        await interaction.response.edit_message(embed=await self.load(), view=self)
+
 class AdminCog(commands.Cog):
-    """Handles ,create, ,revoke, ,status and ,transfer commands."""
+    """Handles ,create, ,revoke, ,status, ,export, ,history and ,transfer commands."""
 
     def __init__(self, bot):
         self.bot = bot
@@ -26,22 +110,16 @@ class AdminCog(commands.Cog):
         try:
             if member is None:
                 await ctx.send("Mention the **user** who gets the slot:")
-                resp = await self.bot.wait_for(
-                    'message', check=lambda m: m.author == ctx.author, timeout=30
-                )
+                resp = await sessions.ask(ctx.author.id, ctx.channel.id, timeout=30)
                 member = await commands.MemberConverter().convert(ctx, resp.content)
 
             if duration is None:
                 await ctx.send("How many **days** should the slot last?")
-                resp = await self.bot.wait_for(
-                    'message', check=lambda m: m.author == ctx.author, timeout=30
-                )
+                resp = await sessions.ask(ctx.author.id, ctx.channel.id, timeout=30)
                 duration = int(resp.content)
 
             await ctx.send("Finally, **slot name**?")
-            resp = await self.bot.wait_for(
-                'message', check=lambda m: m.author == ctx.author, timeout=30
-            )
+            resp = await sessions.ask(ctx.author.id, ctx.channel.id, timeout=30)
             slot_name = resp.content
 
         except asyncio.TimeoutError:
@@ -51,37 +129,37 @@ class AdminCog(commands.Cog):
             await ctx.send(f"Error: {exc}")
             return
 
-        guild = ctx.guild
-        category = guild.get_channel(CATEGORY_ID)
-        overwrites = {
-            guild.default_role: discord.PermissionOverwrite(view_channel=False),
-            member: discord.PermissionOverwrite(view_channel=True, send_messages=True),
-            ctx.author: discord.PermissionOverwrite(view_channel=True, send_messages=True),
-            guild.me: discord.PermissionOverwrite(view_channel=True, send_messages=True)
-        }
+        await self._create(ctx.guild, member, duration, slot_name, ctx.author, ctx.channel)
+
+    async def _create(self, guild, member, duration, slot_name, actor, confirm_to, **confirm_kwargs):
+        category = guild.get_channel(self.bot.guild_settings(guild.id).category_id)
+        overwrites = self.bot.slot_overwrites.for_owner(guild, member)
         channel = await guild.create_text_channel(
             slot_name, category=category, overwrites=overwrites
         )
 
         await db.add_slot(guild.id, channel.id, member.id, slot_name, duration)
+        db.log_event("create", guild.id, channel.id, member.id, actor.id, f"{slot_name} ({duration} days)")
 
         # Create and send the rules embed
         rule_embed = discord.Embed(
             title="Slot rules", colour=rand_colour()
         )
         rule_embed.description = (
-            "• Max **2** `@here` pings per day.\n"
+            f"• Max **{db.DEFAULT_POLICY.here_limit}** `@here` pings per day.\n"
             "• **NO** `@everyone` pings.\n"
             "• Follow staff instructions."
         )
-        await channel.send(member.mention, embed=rule_embed)
-
-        # DM the member
-        await member.send(
-            f"🎉 Your slot **{slot_name}** is live! "
-            f"Slot-ID: `{channel.id}` (expires in {duration} days)."
+        # Post the rules, DM the member and confirm, all at once
+        await asyncio.gather(
+            actions.send(channel, member.mention, embed=rule_embed),
+            actions.dm(
+                member,
+                f"🎉 Your slot **{slot_name}** is live! "
+                f"Slot-ID: `{channel.id}` (expires in {duration} days)."
+            ),
+            actions.send(confirm_to, f"✅ Created {channel.mention} for {member.mention}", **confirm_kwargs),
         )
-        await ctx.send(f"✅ Created {channel.mention} for {member.mention}")
 
     # ----------------------------------------------------------
     @commands.command(name="revoke")
@@ -92,9 +170,7 @@ class AdminCog(commands.Cog):
         try:
             if channel_id is None:
                 await ctx.send("Channel **ID** to revoke:")
-                resp = await self.bot.wait_for(
-                    'message', check=lambda m: m.author == ctx.author, timeout=30
-                )
+                resp = await sessions.ask(ctx.author.id, ctx.channel.id, timeout=30)
                 channel_id = int(resp.content)
 
             channel = ctx.guild.get_channel(channel_id)
@@ -103,9 +179,7 @@ class AdminCog(commands.Cog):
                 return
 
             await ctx.send("Reason for revoke?")
-            resp = await self.bot.wait_for(
-                'message', check=lambda m: m.author == ctx.author, timeout=30
-            )
+            resp = await sessions.ask(ctx.author.id, ctx.channel.id, timeout=30)
             reason = resp.content
 
         except asyncio.TimeoutError:
@@ -115,19 +189,127 @@ class AdminCog(commands.Cog):
         await self._hard_delete(channel, reason, ctx.author)
 
     # ----------------------------------------------------------
+    @commands.command(name="bulkrevoke")
+    async def bulk_revoke(self, ctx, *, flags: BulkRevokeFlags):
+        """Revoke every slot matching all of the given filters."""
+        if not ctx.author.guild_permissions.administrator:
+            return
+        if not (flags.owner or flags.older is not None or flags.expired or flags.category):
+            await ctx.send("Give at least one filter: `owner:`, `older:`, `expired: yes` or `category:`.")
+            return
+
+        targets = self._select_slots(ctx.guild, flags)
+        if not targets:
+            await ctx.send("No slots match those filters.")
+            return
+        if not flags.confirm:
+            await ctx.send(
+                f"⚠️ This would revoke **{len(targets)}** slot(s). "
+                "Re-run the command with `confirm: yes` to go ahead."
+            )
+            return
+
+        # Rows go in one transaction; the Discord side fans out through the dispatcher
+        await db.remove_slots(rec.channel_id for rec in targets)
+        status = await ctx.send(f"🧹 Revoking {len(targets)} slot(s)…")
+        totals = {"deleted": 0, "missing": 0, "failed": 0, "notified": 0}
+        jobs = [
+            asyncio.ensure_future(self._bulk_revoke_one(ctx.guild, rec, flags.reason, ctx.author))
+            for rec in targets
+        ]
+        last_edit = time.monotonic()
+        for done, job in enumerate(asyncio.as_completed(jobs), start=1):
+            try:
+                deleted, notified = await job
+            except Exception:
+                log.exception("bulk revoke failed for one slot")
+                deleted, notified = "failed", False
+            totals[deleted] += 1
+            totals["notified"] += notified
+            if time.monotonic() - last_edit >= PROGRESS_EVERY:
+                last_edit = time.monotonic()
+                await status.edit(content=f"🧹 Revoking… {done}/{len(targets)}")
+
+        await status.edit(
+            content=(
+                f"✅ Bulk revoke finished: {len(targets)} slot(s) removed.\n"
+                f"Channels deleted: {totals['deleted']} · already gone: {totals['missing']} · "
+                f"failed: {totals['failed']} · owners notified: {totals['notified']}"
+            )
+        )
+
+    def _select_slots(self, guild, flags):
+        now = datetime.datetime.utcnow()
+        targets = []
+        for rec in db.registry.for_guild(guild.id):
+            if flags.owner and rec.owner_id != flags.owner.id:
+                continue
+            if flags.older is not None and (
+                rec.created_at is None or rec.created_at > now - datetime.timedelta(days=flags.older)
+            ):
+                continue
+            if flags.expired and (rec.expires_at is None or rec.expires_at > now):
+                continue
+            if flags.category:
+                channel = guild.get_channel(rec.channel_id)
+                if channel is None or channel.category_id != flags.category.id:
+                    continue
+            targets.append(rec)
+        return targets
+
+    async def _bulk_revoke_one(self, guild, rec, reason, actor):
+        """
+        Delete one slot channel and DM its owner; returns (outcome, notified).
+        Never raises: the rows are already gone, so one slot's REST errors
+        must not stop the others from being reported.
+        """
+        db.log_event("revoke", guild.id, rec.channel_id, rec.owner_id, actor.id, reason)
+        channel = guild.get_channel(rec.channel_id)
+        delete = actions.delete_channel(channel, reason=reason) if channel else None
+
+        notified = False
+        try:
+            owner = await resolve_member(guild, rec.owner_id)
+            if owner is not None:
+                notified = bool(await actions.dm(
+                    owner,
+                    f"❌ Your slot **{rec.name}** was revoked.\n"
+                    f"Reason: {reason}\n"
+                    f"By: {actor}"
+                ))
+        except discord.HTTPException:
+            log.warning("could not notify the owner of revoked slot %s", rec.channel_id, exc_info=True)
+
+        outcome = "missing"
+        if delete is not None:
+            try:
+                await delete
+                outcome = "deleted"
+            except discord.NotFound:
+                pass
+            except discord.HTTPException:
+                log.warning("could not delete revoked slot %s", rec.channel_id, exc_info=True)
+                outcome = "failed"
+        return outcome, notified
+
+    # ----------------------------------------------------------
+    @metrics.timed(metrics.REVOKE_SECONDS)
     async def _hard_delete(self, channel: discord.TextChannel, reason: str, actor):
         slot = await db.get_slot_by_channel(channel.id)
+        await db.remove_slot(channel.id)
+        db.log_event("revoke", channel.guild.id, channel.id, slot.owner_id if slot else None, actor.id, reason)
+        pending = [actions.delete_channel(channel, reason=reason)]
         if slot:
-            owner = channel.guild.get_member(slot[3])
+            owner = await resolve_member(channel.guild, slot.owner_id)
             if owner:
                 # Send revocation notice via DM
-                await owner.send(
+                pending.append(actions.dm(
+                    owner,
                     f"❌ Your slot **{channel.name}** was revoked.\n"
                     f"Reason: {reason}\n"
                     f"By: {actor}"
-                )
-        await db.remove_slot(channel.id)
-        await channel.delete(reason=reason)
+                ))
+        await asyncio.gather(*pending)
 
     # ----------------------------------------------------------
     @commands.command(name="status")
@@ -138,15 +320,119 @@ class AdminCog(commands.Cog):
         if slot is None:
             await ctx.send("This channel isn’t a managed slot.")
             return
-        owner = ctx.guild.get_member(slot[3])
+        owner = ctx.guild.get_member(slot.owner_id)
         embed = discord.Embed(
             title=f"Slot status: {channel.name}", colour=rand_colour()
         )
-        embed.add_field(name="Owner", value=owner.mention if owner else slot[3])
-        embed.add_field(name="Created", value=slot[5].split("T")[0])
-        embed.add_field(name="Duration (days)", value=slot[6])
+        embed.add_field(name="Owner", value=owner.mention if owner else slot.owner_id)
+        embed.add_field(name="Created", value=slot.created_at.date().isoformat())
+        embed.add_field(name="Duration (days)", value=slot.duration_days)
+        embed.add_field(name="Pings", value=policies.describe(slot.policy or db.DEFAULT_POLICY), inline=False)
+        await ctx.send(embed=embed)
+
+    # ----------------------------------------------------------
+    @commands.command(name="policy")
+    async def slot_policy(self, ctx, channel: discord.TextChannel | None = None, *, flags: PolicyFlags):
+        """Show or change a slot's @here/@everyone allowances, window and cooldown."""
+        if not ctx.author.guild_permissions.administrator:
+            return
+        channel = channel or ctx.channel
+        slot = await db.get_slot_by_channel(channel.id)
+        if slot is None:
+            await ctx.send("This channel isn’t a managed slot.")
+            return
+
+        if flags.reset:
+            await db.set_slot_policy(channel.id, None)
+            db.log_event("policy", ctx.guild.id, channel.id, slot.owner_id, ctx.author.id, "reset")
+        elif any(v is not None for v in (flags.here, flags.everyone, flags.window, flags.cooldown)):
+            current = slot.policy or db.DEFAULT_POLICY
+            try:
+                window = current.window if flags.window is None else policies.parse_duration(flags.window)
+                cooldown = current.cooldown if flags.cooldown is None else policies.parse_duration(flags.cooldown)
+            except ValueError:
+                await ctx.send("⚠️ Durations look like `30s`, `10m`, `24h` or `2d` (`window: day` for the calendar day).")
+                return
+            policy = db.PingPolicy(
+                current.here_limit if flags.here is None else flags.here,
+                current.everyone_limit if flags.everyone is None else flags.everyone,
+                window, cooldown,
+            )
+            await db.set_slot_policy(channel.id, policy)
+            db.log_event("policy", ctx.guild.id, channel.id, slot.owner_id, ctx.author.id, policies.describe(policy))
+
+        policy = slot.policy or db.DEFAULT_POLICY
+        embed = discord.Embed(title=f"Ping policy: {channel.name}", colour=rand_colour())
+        embed.description = policies.describe(policy)
+        if slot.policy is None:
+            embed.set_footer(text="Default policy")
+        await ctx.send(embed=embed)
+
+    # ----------------------------------------------------------
+    @commands.command(name="config")
+    async def guild_config(self, ctx, *, flags: GuildConfigFlags):
+        """Set this guild's slot category, admin role and admin IDs."""
+        if not ctx.author.guild_permissions.administrator:
+            return
+        admin_ids = None
+        if flags.admins is not None:
+            admin_ids = [int(i) for i in re.findall(r"\d{15,20}", flags.admins)]
+        if flags.category or flags.role or admin_ids is not None:
+            await db.set_guild_config(
+                ctx.guild.id,
+                category_id=flags.category.id if flags.category else None,
+                admin_role_id=flags.role.id if flags.role else None,
+                admin_ids=admin_ids,
+            )
+            self.bot.slot_overwrites.invalidate(ctx.guild.id)
+
+        cfg = self.bot.guild_settings(ctx.guild.id)
+        embed = discord.Embed(title="Slot settings", colour=rand_colour())
+        embed.add_field(name="Category", value=f"<#{cfg.category_id}>")
+        embed.add_field(name="Admin role", value=f"<@&{cfg.admin_role_id}>")
+        embed.add_field(name="Admins", value=" ".join(f"<@{i}>" for i in cfg.admin_ids) or "—", inline=False)
         await ctx.send(embed=embed)
 
+    # ----------------------------------------------------------
+    @commands.command(name="history")
+    async def slot_history(self, ctx, target: discord.Member | discord.TextChannel | None = None):
+        """Page through the audit log for this guild, a member or a slot channel."""
+        if not ctx.author.guild_permissions.administrator:
+            return
+        channel_id = target.id if isinstance(target, discord.TextChannel) else None
+        user_id = target.id if isinstance(target, discord.Member) else None
+
+        async def fetch(before_id):
+            return await db.get_events(ctx.guild.id, channel_id=channel_id, user_id=user_id,
+                                       before_id=before_id, limit=HISTORY_PAGE)
+
+        view = HistoryView(ctx.author.id, fetch)
+        await ctx.send(embed=await view.load(), view=view)
+
+    # ----------------------------------------------------------
+    @commands.command(name="export")
+    async def export_data(self, ctx, table: str = "slots", fmt: str = "csv"):
+        """Attach this guild's slots, ping history or revoke history as CSV/JSONL."""
+        if not ctx.author.guild_permissions.administrator:
+            return
+        import tempfile
+        import export  # only needed here; keeps csv/json off the startup path
+        if table not in export.TABLES or fmt not in export.FORMATS:
+            await ctx.send(f"Usage: `,export <{'|'.join(export.TABLES)}> [{'|'.join(export.FORMATS)}]`")
+            return
+
+        await db.flush()  # include anything still queued in write-behind mode
+        with tempfile.TemporaryFile() as fp:
+            rows = await export.export(table, fmt, fp, guild_id=ctx.guild.id)
+            if fp.tell() > ctx.guild.filesize_limit:
+                await ctx.send(f"⚠️ The export is too large to upload ({fp.tell() // 1024} KiB); use `python export.py` on the host.")
+                return
+            fp.seek(0)
+            await ctx.send(
+                f"📤 Exported {rows} {table} rows.",
+                file=discord.File(fp, filename=f"{table}-{ctx.guild.id}.{fmt}")
+            )
+
     # ----------------------------------------------------------
     @commands.command(name="transfer")
     async def transfer_slot(self, ctx, new_owner: discord.Member | None = None):
@@ -154,33 +440,72 @@ class AdminCog(commands.Cog):
         if slot is None:
             await ctx.send("Run this inside the slot you want to transfer.")
             return
-        if ctx.author.id != slot[3] and not ctx.author.guild_permissions.administrator:
+        if ctx.author.id != slot.owner_id and not ctx.author.guild_permissions.administrator:
             await ctx.send("Only the slot owner or an admin can transfer.")
             return
 
         try:
             if new_owner is None:
                 await ctx.send("Mention the **new owner**:")
-                resp = await self.bot.wait_for(
-                    'message', check=lambda m: m.author == ctx.author, timeout=30
-                )
+                resp = await sessions.ask(ctx.author.id, ctx.channel.id, timeout=30)
                 new_owner = await commands.MemberConverter().convert(ctx, resp.content)
         except asyncio.TimeoutError:
             await ctx.send("⌛ Timed-out.")
             return
 
-        await db.update_slot_owner(ctx.channel.id, new_owner.id)
-        await ctx.channel.set_permissions(
-            new_owner, view_channel=True, send_messages=True
-        )
-        old_owner = ctx.guild.get_member(slot[3])
+        await self._transfer(ctx.channel, slot, new_owner, ctx.author)
+
+    async def _transfer(self, channel, slot, new_owner, actor):
+        old_owner_id = slot.owner_id
+        await db.update_slot_owner(channel.id, new_owner.id)
+        db.log_event("transfer", channel.guild.id, channel.id, new_owner.id, actor.id, f"from {old_owner_id}")
+        edits = [actions.set_permissions(channel, new_owner, overwrite=OWNER_OVERWRITE)]
+        old_owner = await resolve_member(channel.guild, old_owner_id)
         if old_owner and old_owner != new_owner:
-            await ctx.channel.set_permissions(old_owner, overwrite=None)
-        await ctx.send(f"✅ Slot transferred to {new_owner.mention}")
-        await new_owner.send(
-            f"🎁 You have been given control of slot **{ctx.channel.name}**"
+            edits.append(actions.set_permissions(channel, old_owner, overwrite=None))
+        await asyncio.gather(*edits)
+        await asyncio.gather(
+            actions.send(channel, f"✅ Slot transferred to {new_owner.mention}"),
+            actions.dm(
+                new_owner,
+                f"🎁 You have been given control of slot **{channel.name}**"
+            ),
         )
 
+    # ----------------------------------------------------------
+    # Slash-command versions: every argument arrives with the interaction,
+    # so there is nothing to prompt for and no session to wait on.
+    @app_commands.command(name="create", description="Create a slot for a member")
+    @app_commands.guild_only()
+    @app_commands.default_permissions(administrator=True)
+    async def create_slash(self, interaction: discord.Interaction, member: discord.Member,
+                           days: app_commands.Range[int, 1], name: str):
+        if not interaction.user.guild_permissions.administrator:
+            return await interaction.response.send_message("🚫 Admins only.", ephemeral=True)
+        await interaction.response.defer(ephemeral=True)
+        await self._create(interaction.guild, member, days, name, interaction.user,
+                           interaction.followup, ephemeral=True)
+
+    @app_commands.command(name="revoke", description="Delete a slot")
+    @app_commands.guild_only()
+    @app_commands.default_permissions(administrator=True)
+    async def revoke_slash(self, interaction: discord.Interaction, channel: discord.TextChannel, reason: str):
+        if not interaction.user.guild_permissions.administrator:
+            return await interaction.response.send_message("🚫 Admins only.", ephemeral=True)
+        await interaction.response.send_message(f"🗑️ Revoking {channel.mention}...", ephemeral=True)
+        await self._hard_delete(channel, reason, interaction.user)
+
+    @app_commands.command(name="transfer", description="Give this slot to another member")
+    @app_commands.guild_only()
+    async def transfer_slash(self, interaction: discord.Interaction, new_owner: discord.Member):
+        slot = await db.get_slot_by_channel(interaction.channel_id)
+        if slot is None:
+            return await interaction.response.send_message("Run this inside the slot you want to transfer.", ephemeral=True)
+        if interaction.user.id != slot.owner_id and not interaction.user.guild_permissions.administrator:
+            return await interaction.response.send_message("Only the slot owner or an admin can transfer.", ephemeral=True)
+        await interaction.response.send_message("🔁 Transferring...", ephemeral=True)
+        await self._transfer(interaction.channel, slot, new_owner, interaction.user)
+
 async def setup(bot):
     """Cog entry-point for setups."""
     await bot.add_cog(AdminCog(bot))
@@ -0,0 +1,107 @@
+# expiry.py
+
+import asyncio
+import datetime
+import heapq
+import logging
+from discord.ext import commands
+import database as db
+
+log = logging.getLogger(__name__)
+
+class ExpiryCog(commands.Cog):
+    """
+    Revokes slots when `created_at + duration_days` passes.
+
+    Deadlines sit in a min-heap and the task sleeps until the earliest one,
+    so nothing runs until a slot is actually due. Registry changes keep the
+    heap current: new slots are pushed, removed slots are dropped lazily
+    (their heap entry no longer matches `_deadlines` when it surfaces).
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self._heap: list[tuple[datetime.datetime, int]] = []
+        self._deadlines: dict[int, datetime.datetime] = {}
+        self._wake = asyncio.Event()
+        self._task = None
+
+    async def cog_load(self):
+        for rec in db.registry:
+            self._schedule(rec)
+        db.registry.subscribe(self._on_registry_change)
+        self._task = asyncio.create_task(self._run())
+
+    async def cog_unload(self):
+        db.registry.unsubscribe(self._on_registry_change)
+        if self._task:
+            self._task.cancel()
+
+    # ----------------------------------------------------------
+    def _on_registry_change(self, channel_id, rec):
+        if rec is None:
+            self._deadlines.pop(channel_id, None)
+        else:
+            self._schedule(rec)
+
+    def _schedule(self, rec):
+        expires_at = rec.expires_at
+        if expires_at is None:
+            self._deadlines.pop(rec.channel_id, None)
+            return
+        if self._deadlines.get(rec.channel_id) == expires_at:
+            return
+        self._deadlines[rec.channel_id] = expires_at
+        heapq.heappush(self._heap, (expires_at, rec.channel_id))
+        # a new earliest deadline: cut the current sleep short
+        if self._heap[0] == (expires_at, rec.channel_id):
+            self._wake.set()
+        # drop stale entries once they outnumber the live ones
+        if len(self._heap) > 2 * len(self._deadlines) + 64:
+            self._heap = [(exp, cid) for cid, exp in self._deadlines.items()]
+            heapq.heapify(self._heap)
+
+    def _is_live(self, entry):
+        expires_at, channel_id = entry
+        return self._deadlines.get(channel_id) == expires_at
+
+    # ----------------------------------------------------------
+    async def _run(self):
+        await self.bot.wait_until_ready()
+        while True:
+            self._wake.clear()
+            while self._heap and not self._is_live(self._heap[0]):
+                heapq.heappop(self._heap)
+            if not self._heap:
+                await self._wake.wait()
+                continue
+
+            delay = (self._heap[0][0] - datetime.datetime.utcnow()).total_seconds()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            _, channel_id = heapq.heappop(self._heap)
+            del self._deadlines[channel_id]
+            try:
+                await self._expire(channel_id)
+            except Exception:
+                log.exception("failed to expire slot %s", channel_id)
+
+    async def _expire(self, channel_id):
+        channel = self.bot.get_channel(channel_id)
+        admin = self.bot.get_cog("AdminCog")
+        if channel is None or admin is None:
+            # channel already gone: just forget the slot
+            rec = db.registry.peek(channel_id)
+            await db.remove_slot(channel_id)
+            db.log_event("revoke", rec.guild_id if rec else None, channel_id,
+                         rec.owner_id if rec else None, detail="Slot expired")
+            return
+        await admin._hard_delete(channel, "Slot expired", self.bot.user)
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(ExpiryCog(bot))
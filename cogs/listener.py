@@ -1,100 +1,306 @@
 # listener.py
 
+import asyncio
 import datetime
+import logging
+import math
+import os
 import discord
 from discord.ext import commands
-from bot import OWNER_IDS         # ← list of your bot‐owner IDs
 import database as db
-import re
+import metrics
+import policies
+from config import OWNER_IDS
+from dispatcher import actions, resolve_member
+from mentions import scan_message, strip_here
+from overwrites import OWNER_OVERWRITE
 
-LIMIT_PER_DAY = 2
-HERE_PATTERN = re.compile(r'@here', re.IGNORECASE)
-EVERY_PATTERN = re.compile(r'@everyone', re.IGNORECASE)
+log = logging.getLogger(__name__)
 
-class KeepDeleteView(discord.ui.View):
-    def __init__(self, channel: discord.TextChannel, slot_owner_id: int):
-        super().__init__(timeout=None)
-        self.channel = channel
-        self.slot_owner_id = slot_owner_id
+# What happens to a revoked slot nobody decides on: "keep" restores the
+# owner, "delete" removes the channel. Applied DECISION_HOURS after the revoke.
+DEFAULT_DECISION = os.getenv("REVOKE_DEFAULT_ACTION", "keep").lower()
+if DEFAULT_DECISION not in ("keep", "delete"):
+    raise RuntimeError("REVOKE_DEFAULT_ACTION must be 'keep' or 'delete'")
+DECISION_HOURS = float(os.getenv("REVOKE_DECISION_HOURS", "24"))
+# how often the sweeper looks for overdue decisions, and how many per query
+SWEEP_INTERVAL = 60
+SWEEP_BATCH = 100
 
-    @discord.ui.button(label="Keep Slot", style=discord.ButtonStyle.green, custom_id="slot_keep")
-    async def keep(self, interaction, button):
-        if interaction.user.id not in OWNER_IDS:
-            return await interaction.response.send_message("🚫 Nope.", ephemeral=True)
-        user = self.channel.guild.get_member(self.slot_owner_id) or await self.channel.guild.fetch_member(self.slot_owner_id)
-        await self.channel.set_permissions(user, send_messages=True)
-        await interaction.response.send_message(f"✅ Restored {user.mention}.", ephemeral=True)
-        self.stop()
-
-    @discord.ui.button(label="Delete Slot", style=discord.ButtonStyle.red, custom_id="slot_delete")
-    async def delete(self, interaction, button):
+# Pings in one slot within BURST_WINDOW seconds of each other are judged
+# together: one count update, one bulk delete of the excess and at most one
+# revoke, instead of a REST storm and a stack of admin DMs per spammed ping.
+BURST_WINDOW = float(os.getenv("PING_BURST_WINDOW", "0.75"))
+
+# The Keep/Delete buttons are dynamic items: the channel and owner IDs live
+# in each button's custom_id, so one registration at startup handles every
+# revoke DM ever sent, including ones from before a restart. The decision
+# itself lives in the `pending_actions` table, which makes clicks idempotent.
+class _SlotDecision:
+    def __init__(self, channel_id: int, owner_id: int):
+        super().__init__(discord.ui.Button(
+            label=self.label, style=self.style,
+            custom_id=f"slot:{self.action}:{channel_id}:{owner_id}"
+        ))
+        self.channel_id = channel_id
+        self.owner_id = owner_id
+
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        return cls(int(match["channel_id"]), int(match["owner_id"]))
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
         if interaction.user.id not in OWNER_IDS:
-            return await interaction.response.send_message("🚫 Nope.", ephemeral=True)
-        await interaction.response.send_message("🗑️ Deleting slot...", ephemeral=True)
-        await db.remove_slot(self.channel.id)
-        await self.channel.delete(reason="Deleted by bot‐owner")
-        self.stop()
+            await interaction.response.send_message("🚫 Nope.", ephemeral=True)
+            return False
+        return True
+
+    async def callback(self, interaction: discord.Interaction):
+        if interaction.client.get_channel(self.channel_id) is None:
+            # DM clicks only reach shard 0; the slot may live in a guild
+            # another process owns. Leave the row open with the choice on it
+            # for that process's sweeper.
+            pending = await db.choose_pending_action(self.channel_id, self.action, interaction.user.id)
+            if pending is None:
+                return await interaction.response.send_message("ℹ️ This slot has already been handled.", ephemeral=True)
+            return await interaction.response.send_message(
+                f"🕒 Recorded **{self.action}**; it will be applied within {SWEEP_INTERVAL}s.", ephemeral=True
+            )
+        # whoever closes the pending row first acts; later clicks are no-ops
+        pending = await db.resolve_pending_action(self.channel_id, self.action, interaction.user.id)
+        if pending is None:
+            return await interaction.response.send_message("ℹ️ This slot has already been handled.", ephemeral=True)
+        listener = interaction.client.get_cog("PingListener")
+        await interaction.response.send_message(self.working, ephemeral=True)
+        await listener.apply_decision(pending)
+
+class KeepSlotButton(_SlotDecision, discord.ui.DynamicItem[discord.ui.Button], template=r"slot:keep:(?P<channel_id>\d+):(?P<owner_id>\d+)"):
+    action, label, style = "keep", "Keep Slot", discord.ButtonStyle.green
+    working = "✅ Restoring the slot owner..."
+
+class DeleteSlotButton(_SlotDecision, discord.ui.DynamicItem[discord.ui.Button], template=r"slot:delete:(?P<channel_id>\d+):(?P<owner_id>\d+)"):
+    action, label, style = "delete", "Delete Slot", discord.ButtonStyle.red
+    working = "🗑️ Deleting slot..."
+
+class KeepDeleteView(discord.ui.View):
+    """Keep/Delete buttons for one revoked slot; holds no state of its own."""
+
+    def __init__(self, channel_id: int, slot_owner_id: int):
+        super().__init__(timeout=None)
+        self.add_item(KeepSlotButton(channel_id, slot_owner_id))
+        self.add_item(DeleteSlotButton(channel_id, slot_owner_id))
 
 class PingListener(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self._sweeper = None
+        # channel_id -> [(message, everyone)] waiting for BURST_WINDOW to pass,
+        # and the task enforcing that channel's bursts
+        self._bursts: dict[int, list] = {}
+        self._drainers: dict[int, asyncio.Task] = {}
 
-    @commands.Cog.listener()
-    async def on_message(self, message: discord.Message):
-        if message.author.bot or not message.guild:
-            return
+    async def cog_load(self):
+        self.bot.add_dynamic_items(KeepSlotButton, DeleteSlotButton)
+        self._sweeper = asyncio.create_task(self._sweep())
 
-        content = message.content
-        if not (HERE_PATTERN.search(content) or EVERY_PATTERN.search(content)):
-            return
+    async def cog_unload(self):
+        self.bot.remove_dynamic_items(KeepSlotButton, DeleteSlotButton)
+        if self._sweeper:
+            self._sweeper.cancel()
+        for task in self._drainers.values():
+            task.cancel()
+
+    async def handle_message(self, message: discord.Message) -> bool:
+        """
+        Enforce the ping rules on one slot-channel message. Called by the
+        bot's MessageRouter rather than as a listener; returns False when
+        the message carried no mass mention.
+
+        Pings are not judged here but queued on their channel's burst, which
+        _drain() enforces BURST_WINDOW seconds later.
+        """
+        mentions = scan_message(message)
+        if not mentions:
+            return False
 
         slot = await db.get_slot_by_channel(message.channel.id)
         if not slot:
-            return
+            return False
 
-        owner_id = slot.owner_id
+        channel_id = message.channel.id
+        burst = self._bursts.get(channel_id)
+        if burst is None:
+            burst = self._bursts[channel_id] = []
+        burst.append((message, mentions.everyone))
+        if channel_id not in self._drainers:
+            self._drainers[channel_id] = asyncio.create_task(self._drain(message.channel))
+        return True
 
-        # 1) Handle @everyone immediately
-        if EVERY_PATTERN.search(content):
-            await message.delete()
-            return await self._revoke(message.channel, owner_id, "Used @everyone")
+    async def _drain(self, channel):
+        """
+        Enforce one channel's bursts one after another. Pings arriving while
+        a burst is being enforced form the next burst, so a channel is never
+        judged by two tasks at once.
+        """
+        try:
+            while True:
+                await asyncio.sleep(BURST_WINDOW)
+                burst = self._bursts.pop(channel.id, None)
+                if not burst:
+                    return
+                try:
+                    # the router's "slots" stage only times the enqueue
+                    with metrics.timer(metrics.STAGE_SECONDS, stage="enforce"):
+                        await self._enforce(channel, burst)
+                except Exception:
+                    log.exception("failed to enforce %d pings in %s", len(burst), channel.id)
+        finally:
+            self._drainers.pop(channel.id, None)
 
-        # 2) It's a @here – count and decide
-        today = datetime.datetime.utcnow().strftime("%Y-%m-%d")
-        count = await db.bump_ping(message.channel.id, today)
+    async def _enforce(self, channel, burst):
+        """Judge a burst of (message, everyone) pings as one decision."""
+        slot = await db.get_slot_by_channel(channel.id)
+        if slot is None:
+            return  # the slot went away meanwhile
+        verdicts = await policies.evaluator_for(slot).check_burst([everyone for _, everyone in burst])
 
-        if count <= LIMIT_PER_DAY:
-            # just strip the @here and leave the rest
-            new_content = HERE_PATTERN.sub("", content)
-            try:
-                await message.edit(content=new_content)
-            except discord.Forbidden:
+        deleted, allowed = [], []
+        reason = cooldown = None
+        for (message, everyone), verdict in zip(burst, verdicts):
+            if verdict.action == policies.REVOKE:
+                deleted.append(message)
+                if not everyone:
+                    reason = "Exceeded @here limit"
+                elif verdict.limit:
+                    reason = "Exceeded @everyone limit"
+                else:
+                    reason = "Used @everyone"
+            elif verdict.action == policies.COOLDOWN:
+                # too soon after the last one: counted, but not let through
+                deleted.append(message)
+                cooldown = verdict
+            else:
+                allowed.append((message, everyone, verdict))
+        # judging stopped at the revoke; whatever followed it goes too
+        deleted.extend(message for message, _ in burst[len(verdicts):])
+
+        # allowed: @everyone stays as sent; @here is stripped, the rest left
+        edits = [(m, m.edit(content=strip_here(m.content))) for m, everyone, _ in allowed if not everyone]
+        results = await asyncio.gather(*(edit for _, edit in edits), return_exceptions=True)
+        for (message, _), result in zip(edits, results):
+            if isinstance(result, discord.Forbidden):
                 # fallback: delete if edit not allowed
-                await message.delete()
-        else:
-            # 3rd+ @here → full delete + revoke
-            await message.delete()
-            await self._revoke(message.channel, owner_id, "Exceeded @here limit")
+                deleted.append(message)
+            elif isinstance(result, Exception):
+                log.warning("could not strip @here in %s", channel.id, exc_info=result)
+
+        jobs = []
+        if deleted:
+            jobs.append(actions.delete_messages(channel, deleted, reason="Slot ping rules"))
+        if cooldown is not None:
+            jobs.append(actions.send(channel, embed=discord.Embed(
+                description=f"⏳ Next ping allowed in {math.ceil(cooldown.retry_after)}s.",
+                color=discord.Color.orange()
+            )))
+        jobs.extend(self._notices(slot, allowed))
+        if reason is not None:
+            jobs.append(self._revoke(channel, slot.owner_id, reason))
+        await asyncio.gather(*jobs)
+
+    def _notices(self, slot, allowed):
+        """The latest count for each kind of ping let through, and a warning on the last one."""
+        latest = {}
+        for message, everyone, verdict in allowed:
+            latest[everyone] = (message, verdict)
+        for everyone, (message, verdict) in latest.items():
+            kind = "@everyone" if everyone else "@here"
+            label = "@everyone ping" if everyone else "Ping"
+            # show 1/2 or 2/2, and warn the owner on the last one
+            yield actions.send(
+                message.channel,
+                embed=discord.Embed(description=f"🔔 {label} {verdict.count}/{verdict.limit}", color=discord.Color.blue())
+            )
+            if verdict.action == policies.LAST:
+                window = (slot.policy or db.DEFAULT_POLICY).window
+                if everyone:
+                    window = window or policies.EVERYONE_DAY
+                period = f"rolling {policies.format_duration(window)}" if window else "daily"
+                yield actions.dm(
+                    message.author,
+                    embed=discord.Embed(
+                        description=f"⚠️ You have reached your {verdict.limit}/{verdict.limit} {period} {kind} ping limit.",
+                        color=discord.Color.orange()
+                    )
+                )
 
     async def _revoke(self, channel, slot_owner_id, reason):
         # revoke perms
-        user = channel.guild.get_member(slot_owner_id) or await channel.guild.fetch_member(slot_owner_id)
-        await channel.set_permissions(user, send_messages=False)
-
-        # notify bot‐owners
-        for admin_id in OWNER_IDS:
-            admin = channel.guild.get_member(admin_id) or await self.bot.fetch_user(admin_id)
-            view = KeepDeleteView(channel, slot_owner_id)
-            self.bot.add_view(view)
+        user = await resolve_member(channel.guild, slot_owner_id)
+        jobs = [actions.set_permissions(channel, user, send_messages=False)] if user else []
+
+        deadline = datetime.datetime.utcnow() + datetime.timedelta(hours=DECISION_HOURS)
+        if not await db.open_pending_action(channel.guild.id, channel.id, slot_owner_id, reason, DEFAULT_DECISION, deadline):
+            # already revoked and awaiting a decision: the admins have their DM
+            await asyncio.gather(*jobs)
+            return
+        db.log_event("violation", channel.guild.id, channel.id, slot_owner_id, detail=reason)
+
+        # notify bot‐owners, all DMs in parallel
+        admins = await asyncio.gather(*(self._resolve_user(channel.guild, i) for i in OWNER_IDS))
+        view = KeepDeleteView(channel.id, slot_owner_id)
+        text = (
+            f"🔒 Slot **{channel.name}** (owner <@{slot_owner_id}>) was revoked.\n"
+            f"Reason: {reason}\n\n"
+            "🟢 **Keep Slot** to restore or 🔴 **Delete Slot** to remove it.\n"
+            f"No answer by {discord.utils.format_dt(deadline.replace(tzinfo=datetime.timezone.utc), 'R')} "
+            f"→ **{DEFAULT_DECISION}**."
+        )
+        jobs.extend(actions.dm(admin, text, view=view) for admin in admins)
+        await asyncio.gather(*jobs)
+
+    # ----------------------------------------------------------
+    async def apply_decision(self, pending: db.PendingAction):
+        """Carry out a resolved decision; its row must already be closed."""
+        channel = self.bot.get_channel(pending.channel_id)
+        db.log_event("decision", pending.guild_id, pending.channel_id, pending.owner_id, pending.resolved_by,
+                     pending.resolution if pending.resolved_by else f"{pending.resolution} (default)")
+        if pending.resolution == "delete":
+            await db.remove_slot(pending.channel_id)
+            if channel is not None:
+                await actions.delete_channel(channel, reason="Deleted by bot‐owner")
+            return
+        if channel is None:
+            return
+        # the slot may have changed hands since the revoke
+        slot = db.registry.peek(pending.channel_id)
+        user = await resolve_member(channel.guild, slot.owner_id if slot else pending.owner_id)
+        if user is not None:
+            # the full owner overwrite; send_messages=True alone would replace
+            # it and drop the owner's view/mention grants
+            await actions.set_permissions(channel, user, overwrite=OWNER_OVERWRITE)
+
+    async def _sweep(self):
+        """
+        Apply decisions chosen on another process, and the default action to
+        decisions left open past their deadline.
+        """
+        await self.bot.wait_until_ready()
+        while True:
             try:
-                await admin.send(
-                    f"🔒 Slot **{channel.name}** (owner <@{slot_owner_id}>) was revoked.\n"
-                    f"Reason: {reason}\n\n"
-                    "🟢 **Keep Slot** to restore or 🔴 **Delete Slot** to remove it.",
-                    view=view
-                )
-            except discord.Forbidden:
-                pass
+                due = await db.claim_due_pending_actions([g.id for g in self.bot.guilds], SWEEP_BATCH)
+            except Exception:
+                log.exception("pending-decision sweep failed")
+                due = []
+            results = await asyncio.gather(*(self.apply_decision(p) for p in due), return_exceptions=True)
+            for pending, result in zip(due, results):
+                if isinstance(result, Exception):
+                    log.error("failed to apply %r", pending, exc_info=result)
+            # a full batch means more may be due already
+            if len(due) < SWEEP_BATCH:
+                await asyncio.sleep(SWEEP_INTERVAL)
+
+    async def _resolve_user(self, guild, user_id):
+        return guild.get_member(user_id) or await actions.fetch_user(self.bot, user_id)
 
 async def setup(bot: commands.Bot):
     await bot.add_cog(PingListener(bot))
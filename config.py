@@ -0,0 +1,57 @@
+"""
+Settings shared by bot.py and the cogs.
+
+Only the standard library is imported here, so a cog can `import config`
+without importing bot.py (and constructing its Bot) as a side effect.
+"""
+import os
+
+# ─── DEFAULTS ─────────────────────────────────────────────────────────────
+# Per-guild overrides live in the guild_config table (see ,config).
+BOT_PREFIX      = ","
+CATEGORY_ID     = 1375748081735172126
+ADMIN_ROLE_ID   = 1375747962487181342
+ADMIN_IDS       = {
+    993153549095673936,
+    1241446608424407052,
+    1083998643322892401,
+    981093886351003709
+}
+
+# Bot owners: they get the Keep/Delete DM when a slot is revoked
+OWNER_IDS = [int(i) for i in os.getenv("OWNER_IDS", "").split(",") if i]
+
+# Loaded concurrently by SlotBot.setup_hook
+EXTENSIONS = ("cogs.admin", "cogs.listener", "cogs.expiry")
+
+# ─── GATEWAY ──────────────────────────────────────────────────────────────
+# "slim" (default) or "full"; see build_intents() in bot.py
+INTENTS_PROFILE = os.getenv("INTENTS_PROFILE", "slim")
+
+# Leave SHARD_COUNT unset for a single plain Bot. Setting it runs an
+# AutoShardedBot; SHARD_IDS ("0-3" or "0,2,5") then picks the shards this
+# process owns, so one deployment can be spread over several processes,
+# each keeping only its own guilds' slots, config and expiry deadlines.
+def parse_shard_ids(spec: str) -> list[int] | None:
+    if not spec:
+        return None
+    ids = []
+    for part in spec.split(","):
+        lo, _, hi = part.partition("-")
+        ids.extend(range(int(lo), int(hi or lo) + 1))
+    return ids
+
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "0")) or None
+SHARD_IDS = parse_shard_ids(os.getenv("SHARD_IDS", ""))
+if SHARD_IDS and not SHARD_COUNT:
+    raise RuntimeError("SHARD_IDS needs SHARD_COUNT")
+
+# Discord delivers DMs (and DM button clicks) to shard 0 only. A process
+# without shard 0 never sees a DM reply, so ,Aslot can't prompt for a key in
+# DMs there; users are sent to /aslot or `,Aslot <key>` instead. Keep/Delete
+# clicks are recorded by the shard-0 process and applied by the owning one.
+RECEIVES_DMS = not SHARD_IDS or 0 in SHARD_IDS
+
+# Push the slash commands (/create, /revoke, /transfer, /aslot) to Discord on
+# startup. Only needed after they change; syncing is rate limited.
+SYNC_APP_COMMANDS = os.getenv("SYNC_APP_COMMANDS", "0") == "1"
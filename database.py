@@ -1,8 +1,39 @@
+import asyncio
+import json
+import logging
+import os
 import aiosqlite
-from datetime import datetime
+import metrics
+from datetime import datetime, timedelta
+
+log = logging.getLogger(__name__)
 
 DB_FILE = "slotbot.db"
 
+# ─── DURABILITY ───────────────────────────────────────────────────────────
+# PRAGMA synchronous for the writer: FULL fsyncs every commit, NORMAL only at
+# WAL checkpoints (a power cut can lose the last few commits), OFF never.
+SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", "NORMAL").upper()
+# Write-behind mode: ping counters and slot mutations are applied in memory
+# straight away and flushed to SQLite in one transaction every
+# FLUSH_INTERVAL seconds, or sooner once FLUSH_MAX_PENDING writes pile up.
+# A crash can lose at most one interval of writes; close_db() always flushes.
+WRITE_BEHIND = os.getenv("DB_WRITE_BEHIND", "0") == "1"
+FLUSH_INTERVAL = float(os.getenv("DB_FLUSH_INTERVAL", "1.0"))
+FLUSH_MAX_PENDING = int(os.getenv("DB_FLUSH_MAX_PENDING", "256"))
+# Days of per-day ping totals to keep in `pings` once a day is over; 0 keeps
+# none (only today's counters are stored, in `ping_counters`, and older
+# `pings` rows are pruned at startup and every midnight).
+PING_HISTORY_DAYS = int(os.getenv("PING_HISTORY_DAYS", "0"))
+# Audit events are buffered in memory and appended every EVENT_FLUSH_INTERVAL
+# seconds, or once EVENT_BATCH of them are waiting.
+EVENT_FLUSH_INTERVAL = float(os.getenv("DB_EVENT_FLUSH_INTERVAL", "2.0"))
+EVENT_BATCH = 200
+
+# Size of sqlite3's per-connection prepared-statement cache. Every helper
+# below uses a fixed SQL string, so they all stay compiled after first use.
+STATEMENT_CACHE_SIZE = 128
+
 SCHEMA = """
 CREATE TABLE IF NOT EXISTS slots(
     slot_id       INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -21,51 +52,864 @@ CREATE TABLE IF NOT EXISTS pings(
 );
 """
 
-async def init_db():
-    async with aiosqlite.connect(DB_FILE) as db:
-        await db.executescript(SCHEMA)
-        await db.commit()
+# Schema migrations, applied in order on top of SCHEMA. PRAGMA user_version
+# records how many have run, so existing slotbot.db files are upgraded in
+# place the first time a newer bot starts against them.
+MIGRATIONS = [
+    # 1: one pings row per (channel, day). Older files may hold duplicates
+    #    from racing bump_ping calls, so fold them into the oldest row first.
+    """
+    UPDATE pings SET ping_count = (
+        SELECT SUM(p.ping_count) FROM pings p
+        WHERE p.channel_id = pings.channel_id AND p.date_key = pings.date_key
+    )
+    WHERE id IN (SELECT MIN(id) FROM pings GROUP BY channel_id, date_key HAVING COUNT(*) > 1);
+    DELETE FROM pings
+    WHERE id NOT IN (SELECT MIN(id) FROM pings GROUP BY channel_id, date_key);
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_pings_channel_day ON pings(channel_id, date_key);
+    """,
+    # 2: slot keys that may no longer be redeemed
+    """
+    CREATE TABLE IF NOT EXISTS revoked_keys(
+        key_id      INTEGER PRIMARY KEY,
+        revoked_at  TEXT
+    );
+    """,
+    # 3: per-guild settings for multi-guild deployments (NULL = bot default)
+    """
+    CREATE TABLE IF NOT EXISTS guild_config(
+        guild_id      INTEGER PRIMARY KEY,
+        category_id   INTEGER,
+        admin_role_id INTEGER,
+        admin_ids     TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_slots_guild ON slots(guild_id);
+    """,
+    # 4: revokes awaiting an admin's Keep/Delete decision. The partial
+    #    indexes only cover open rows: one per channel, and the sweeper's
+    #    "what is due" scan by deadline.
+    """
+    CREATE TABLE IF NOT EXISTS pending_actions(
+        id             INTEGER PRIMARY KEY AUTOINCREMENT,
+        guild_id       INTEGER NOT NULL,
+        channel_id     INTEGER NOT NULL,
+        owner_id       INTEGER NOT NULL,
+        reason         TEXT,
+        created_at     TEXT NOT NULL,
+        deadline       TEXT NOT NULL,
+        default_action TEXT NOT NULL,
+        resolved_at    TEXT,
+        resolution     TEXT,
+        resolved_by    INTEGER
+    );
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_pending_open_channel
+        ON pending_actions(channel_id) WHERE resolved_at IS NULL;
+    CREATE INDEX IF NOT EXISTS idx_pending_due
+        ON pending_actions(deadline) WHERE resolved_at IS NULL;
+    """,
+    # 5: today's @here count lives in one row per channel; `pings` becomes
+    #    the optional per-day history, pruned by date.
+    """
+    CREATE TABLE IF NOT EXISTS ping_counters(
+        channel_id INTEGER PRIMARY KEY,
+        date_key   TEXT NOT NULL,
+        ping_count INTEGER NOT NULL
+    );
+    INSERT OR REPLACE INTO ping_counters(channel_id, date_key, ping_count)
+        SELECT channel_id, MAX(date_key), ping_count FROM pings GROUP BY channel_id;
+    CREATE INDEX IF NOT EXISTS idx_pings_day ON pings(date_key);
+    """,
+    # 6: append-only audit trail of slot lifecycle events. Rows outlive the
+    #    slot they describe; the id order is the event order.
+    """
+    CREATE TABLE IF NOT EXISTS slot_events(
+        id         INTEGER PRIMARY KEY AUTOINCREMENT,
+        at         TEXT NOT NULL,
+        guild_id   INTEGER,
+        channel_id INTEGER,
+        user_id    INTEGER,
+        actor_id   INTEGER,
+        kind       TEXT NOT NULL,
+        detail     TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_events_channel ON slot_events(channel_id, id);
+    CREATE INDEX IF NOT EXISTS idx_events_user ON slot_events(user_id, id);
+    CREATE INDEX IF NOT EXISTS idx_events_guild ON slot_events(guild_id, id);
+    CREATE INDEX IF NOT EXISTS idx_events_at ON slot_events(at);
+    """,
+    # 7: per-slot ping allowances; slots without a row use DEFAULT_POLICY
+    """
+    CREATE TABLE IF NOT EXISTS slot_policies(
+        channel_id       INTEGER PRIMARY KEY,
+        here_limit       INTEGER NOT NULL,
+        everyone_limit   INTEGER NOT NULL,
+        window_seconds   INTEGER NOT NULL,
+        cooldown_seconds INTEGER NOT NULL
+    );
+    """,
+    # 8: a Keep/Delete click handled by a process that doesn't own the
+    #    slot's guild (DM interactions only reach shard 0) is recorded here,
+    #    for the owning process's sweeper to apply.
+    """
+    ALTER TABLE pending_actions ADD COLUMN choice TEXT;
+    ALTER TABLE pending_actions ADD COLUMN chosen_by INTEGER;
+    CREATE INDEX IF NOT EXISTS idx_pending_chosen
+        ON pending_actions(guild_id) WHERE resolved_at IS NULL AND choice IS NOT NULL;
+    """,
+]
+
+# ─── CONNECTIONS ──────────────────────────────────────────────────────────
+# One long-lived writer and one long-lived reader, opened by init_db() and
+# closed by close_db(). Each aiosqlite connection owns its own thread, so in
+# WAL mode lookups on the reader never wait behind a commit on the writer.
+_writer: aiosqlite.Connection | None = None
+_reader: aiosqlite.Connection | None = None
+# Serialises multi-statement transactions on the shared writer.
+_write_lock = asyncio.Lock()
+# Which guilds' slots/config this process keeps in memory (see init_db).
+_owns_guild = lambda guild_id: True
+
+async def _connect(readonly=False):
+    conn = await aiosqlite.connect(DB_FILE, cached_statements=STATEMENT_CACHE_SIZE)
+    await conn.execute("PRAGMA busy_timeout = 5000")
+    if readonly:
+        await conn.execute("PRAGMA query_only = ON")
+    else:
+        await conn.execute("PRAGMA journal_mode = WAL")
+        await conn.execute(f"PRAGMA synchronous = {SYNCHRONOUS}")
+    return conn
+
+async def connect_readonly():
+    """A separate read-only connection for long scans such as exports; caller closes it."""
+    return await _connect(readonly=True)
+
+async def _migrate(conn):
+    cur = await conn.execute("PRAGMA user_version")
+    (version,) = await cur.fetchone()
+    for number, script in enumerate(MIGRATIONS[version:], start=version + 1):
+        await conn.executescript(f"BEGIN;\n{script}\nPRAGMA user_version = {number};\nCOMMIT;")
+
+async def init_db(owns_guild=None):
+    """
+    Create the schema and open the shared connections (idempotent).
+
+    `owns_guild(guild_id) -> bool` limits the in-memory state to the guilds
+    this process serves, for deployments split across processes by shard.
+    """
+    global _writer, _reader, _flusher_task, _rollover_task, _events_task, _owns_guild
+    if _writer is not None:
+        return
+    _owns_guild = owns_guild or (lambda guild_id: True)
+    _writer = await _connect()
+    await _writer.executescript(SCHEMA)
+    await _writer.commit()
+    await _migrate(_writer)
+    _reader = await _connect(readonly=True)
+    await _load_registry()
+    await _load_policies()
+    await _load_guild_configs()
+    await _load_revoked_keys()
+    await _load_ping_counts()
+    await rollover_pings()  # catch up on days that ended while we were down
+    _rollover_task = asyncio.create_task(_rollover())
+    _events_task = asyncio.create_task(_event_writer())
+    if WRITE_BEHIND:
+        _flusher_task = asyncio.create_task(_flusher())
+
+async def close_db():
+    """Flush pending writes and close the shared connections; safe to call more than once."""
+    global _writer, _reader, _flusher_task, _rollover_task, _events_task
+    for task in (_flusher_task, _rollover_task, _events_task):
+        if task is not None:
+            task.cancel()
+    _flusher_task = _rollover_task = _events_task = None
+    if _writer is not None:
+        await flush()
+        await flush_events()
+    if _reader is not None:
+        await _reader.close()
+        _reader = None
+    if _writer is not None:
+        async with _write_lock:
+            await _writer.commit()
+            await _writer.close()
+        _writer = None
+
+# ─── WRITE-BEHIND QUEUE ───────────────────────────────────────────────────
+# Only used when WRITE_BEHIND is on.
+_pending_ops: list[tuple[str, tuple]] = []       # slot mutations, in order
+_ping_dirty: dict[int, tuple[str, int]] = {}     # channel -> unflushed (day, count)
+_flush_wanted = asyncio.Event()
+_flusher_task: asyncio.Task | None = None
+
+def _note_pending():
+    if len(_pending_ops) + len(_ping_dirty) >= FLUSH_MAX_PENDING:
+        _flush_wanted.set()
+
+async def _write(*statements):
+    """Run (sql, params) pairs in one transaction, or queue them in write-behind mode."""
+    if WRITE_BEHIND:
+        _pending_ops.extend(statements)
+        _note_pending()
+        return None
+    async with _write_lock:
+        cur = None
+        for sql, params in statements:
+            cur = await _writer.execute(sql, params)
+        await _writer.commit()
+        return cur
+
+@metrics.timed(metrics.DB_SECONDS, helper="flush")
+async def flush():
+    """Write all queued slot mutations and ping counters in one transaction."""
+    if not (_pending_ops or _ping_dirty):
+        return
+    ops = _pending_ops[:]
+    dirty = dict(_ping_dirty)
+    _pending_ops.clear()
+    _ping_dirty.clear()
+    async with _write_lock:
+        try:
+            for sql, params in ops:
+                await _writer.execute(sql, params)
+            if dirty:
+                await _writer.executemany(
+                    _SET_PING_COUNT, [(c, d, n) for c, (d, n) in dirty.items()])
+            await _writer.commit()
+        except Exception:
+            await _writer.rollback()
+            # put everything back so the next flush retries it; counters
+            # bumped again since then already carry the newer total
+            _pending_ops[:0] = ops
+            for channel_id, value in dirty.items():
+                _ping_dirty.setdefault(channel_id, value)
+            raise
+
+async def _flusher():
+    while True:
+        try:
+            await asyncio.wait_for(_flush_wanted.wait(), FLUSH_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        _flush_wanted.clear()
+        try:
+            # shielded so close_db() cancelling us can't drop a half-written batch
+            await asyncio.shield(flush())
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            log.exception("write-behind flush failed; will retry")
+
+# ─── SLOT REGISTRY ────────────────────────────────────────────────────────
+class SlotRecord:
+    """
+    One row of the `slots` table, kept in memory. `policy` is its
+    slot_policies row (None: DEFAULT_POLICY); `evaluator` caches that
+    policy compiled by policies.evaluator_for().
+    """
+    __slots__ = ("slot_id", "guild_id", "channel_id", "owner_id",
+                 "name", "created_at", "duration_days", "policy", "evaluator")
+
+    def __init__(self, slot_id, guild_id, channel_id, owner_id, name, created_at, duration_days):
+        self.slot_id = slot_id
+        self.guild_id = guild_id
+        self.channel_id = channel_id
+        self.owner_id = owner_id
+        self.name = name
+        self.created_at = created_at
+        self.duration_days = duration_days
+        self.policy = None
+        self.evaluator = None
+
+    @classmethod
+    def from_row(cls, row):
+        slot_id, guild_id, channel_id, user_id, name, created_at, days = row
+        return cls(slot_id, guild_id, channel_id, user_id, name,
+                   datetime.fromisoformat(created_at) if created_at else None, days)
+
+    @property
+    def expires_at(self):
+        if self.created_at is None or self.duration_days is None:
+            return None
+        return self.created_at + timedelta(days=self.duration_days)
+
+    def __repr__(self):
+        return f"<SlotRecord channel_id={self.channel_id} owner_id={self.owner_id} name={self.name!r}>"
+
+class SlotRegistry:
+    """
+    Authoritative in-memory view of the `slots` table, keyed by channel_id.
+    Loaded once by init_db() and kept current by the write helpers below,
+    so "is this channel a slot?" never touches the disk.
+
+    Subscribers are called as ``callback(channel_id, record)`` whenever a slot
+    is added or changed, and with ``record=None`` when it is removed.
+    """
+
+    def __init__(self):
+        self._slots: dict[int, SlotRecord] = {}
+        self._by_guild: dict[int, dict[int, SlotRecord]] = {}
+        self._subscribers = []
+        self.hits = 0
+        self.misses = 0
+
+    def subscribe(self, callback):
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    def _notify(self, channel_id, rec):
+        for callback in self._subscribers:
+            callback(channel_id, rec)
+
+    def __len__(self):
+        return len(self._slots)
+
+    def __contains__(self, channel_id):
+        return channel_id in self._slots
+
+    def __iter__(self):
+        return iter(list(self._slots.values()))
+
+    def get(self, channel_id):
+        rec = self._slots.get(channel_id)
+        if rec is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return rec
+
+    def peek(self, channel_id):
+        """Like get(), but doesn't touch the hit/miss counters."""
+        return self._slots.get(channel_id)
+
+    def for_guild(self, guild_id):
+        return list(self._by_guild.get(guild_id, {}).values())
+
+    def put(self, rec: SlotRecord):
+        self._slots[rec.channel_id] = rec
+        self._by_guild.setdefault(rec.guild_id, {})[rec.channel_id] = rec
+        self._notify(rec.channel_id, rec)
+
+    def pop(self, channel_id):
+        rec = self._slots.pop(channel_id, None)
+        if rec is not None:
+            guild_slots = self._by_guild.get(rec.guild_id)
+            if guild_slots is not None:
+                guild_slots.pop(channel_id, None)
+                if not guild_slots:
+                    del self._by_guild[rec.guild_id]
+            self._notify(channel_id, None)
+        return rec
+
+    def drop_guild(self, guild_id):
+        """Forget a guild's slots in memory only (e.g. the bot left it)."""
+        for channel_id in list(self._by_guild.get(guild_id, ())):
+            self.pop(channel_id)
+
+    def clear(self):
+        self._slots.clear()
+        self._by_guild.clear()
+        self.hits = self.misses = 0
+
+    def stats(self):
+        return {"slots": len(self._slots), "hits": self.hits, "misses": self.misses}
+
+registry = SlotRegistry()
+
+async def _load_registry():
+    registry.clear()
+    cur = await _reader.execute("SELECT * FROM slots")
+    for row in await cur.fetchall():
+        if _owns_guild(row[1]):
+            registry.put(SlotRecord.from_row(row))
+
+@metrics.timed(metrics.DB_SECONDS, helper="load_guild")
+async def load_guild(guild_id):
+    """
+    Load one guild's slots and their policies into the registry, e.g. when
+    the bot is re-added to a guild whose rows drop_guild() left behind.
+    """
+    if not _owns_guild(guild_id):
+        return
+    await flush()  # the reader must see writes still queued in write-behind mode
+    cur = await _reader.execute("SELECT * FROM slots WHERE guild_id = ?", (guild_id,))
+    for row in await cur.fetchall():
+        registry.put(SlotRecord.from_row(row))
+    await _load_policies(guild_id)
+
+# ─── PING POLICIES ────────────────────────────────────────────────────────
+class PingPolicy:
+    """
+    Mass-mention allowances for one slot. `window` is in seconds, with 0
+    meaning the UTC calendar day. `cooldown` is the minimum number of
+    seconds between two allowed pings.
+    """
+    __slots__ = ("here_limit", "everyone_limit", "window", "cooldown")
+
+    def __init__(self, here_limit=2, everyone_limit=0, window=0, cooldown=0):
+        self.here_limit = here_limit
+        self.everyone_limit = everyone_limit
+        self.window = window
+        self.cooldown = cooldown
+
+    @classmethod
+    def from_row(cls, row):
+        _, here_limit, everyone_limit, window, cooldown = row
+        return cls(here_limit, everyone_limit, window, cooldown)
+
+    def __repr__(self):
+        return (f"<PingPolicy here={self.here_limit} everyone={self.everyone_limit} "
+                f"window={self.window} cooldown={self.cooldown}>")
+
+DEFAULT_POLICY = PingPolicy()
+
+async def _load_policies(guild_id=None):
+    if guild_id is None:
+        cur = await _reader.execute("SELECT * FROM slot_policies")
+    else:
+        cur = await _reader.execute(
+            "SELECT p.* FROM slot_policies p JOIN slots s ON s.channel_id = p.channel_id "
+            "WHERE s.guild_id = ?", (guild_id,))
+    for row in await cur.fetchall():
+        rec = registry.peek(row[0])
+        if rec is not None:
+            rec.policy = PingPolicy.from_row(row)
 
+@metrics.timed(metrics.DB_SECONDS, helper="set_slot_policy")
+async def set_slot_policy(channel_id, policy: PingPolicy | None):
+    """Give a slot its own policy, or None to go back to DEFAULT_POLICY."""
+    if policy is None:
+        await _write(("DELETE FROM slot_policies WHERE channel_id = ?", (channel_id,)))
+    else:
+        await _write((
+            "INSERT INTO slot_policies(channel_id,here_limit,everyone_limit,window_seconds,cooldown_seconds) "
+            "VALUES(?,?,?,?,?) ON CONFLICT(channel_id) DO UPDATE SET here_limit = excluded.here_limit, "
+            "everyone_limit = excluded.everyone_limit, window_seconds = excluded.window_seconds, "
+            "cooldown_seconds = excluded.cooldown_seconds",
+            (channel_id, policy.here_limit, policy.everyone_limit, policy.window, policy.cooldown)
+        ))
+    rec = registry.peek(channel_id)
+    if rec is not None:
+        rec.policy = policy
+        rec.evaluator = None  # recompiled on the next ping
+
+# ─── GUILD CONFIG ─────────────────────────────────────────────────────────
+class GuildConfig:
+    """Per-guild overrides; None fields fall back to the bot's defaults."""
+    __slots__ = ("guild_id", "category_id", "admin_role_id", "admin_ids")
+
+    def __init__(self, guild_id, category_id=None, admin_role_id=None, admin_ids=None):
+        self.guild_id = guild_id
+        self.category_id = category_id
+        self.admin_role_id = admin_role_id
+        self.admin_ids = frozenset(admin_ids) if admin_ids is not None else None
+
+    @classmethod
+    def from_row(cls, row):
+        guild_id, category_id, admin_role_id, admin_ids = row
+        ids = None if admin_ids is None else [int(i) for i in admin_ids.split(",") if i]
+        return cls(guild_id, category_id, admin_role_id, ids)
+
+guild_configs: dict[int, GuildConfig] = {}
+
+async def _load_guild_configs():
+    guild_configs.clear()
+    cur = await _reader.execute("SELECT * FROM guild_config")
+    for row in await cur.fetchall():
+        if _owns_guild(row[0]):
+            guild_configs[row[0]] = GuildConfig.from_row(row)
+
+def get_guild_config(guild_id):
+    return guild_configs.get(guild_id)
+
+@metrics.timed(metrics.DB_SECONDS, helper="set_guild_config")
+async def set_guild_config(guild_id, category_id=None, admin_role_id=None, admin_ids=None):
+    """Store a guild's settings; omitted fields keep their current value."""
+    current = guild_configs.get(guild_id) or GuildConfig(guild_id)
+    cfg = GuildConfig(
+        guild_id,
+        category_id if category_id is not None else current.category_id,
+        admin_role_id if admin_role_id is not None else current.admin_role_id,
+        admin_ids if admin_ids is not None else current.admin_ids,
+    )
+    await _write((
+        "INSERT INTO guild_config(guild_id,category_id,admin_role_id,admin_ids) VALUES(?,?,?,?) "
+        "ON CONFLICT(guild_id) DO UPDATE SET category_id = excluded.category_id, "
+        "admin_role_id = excluded.admin_role_id, admin_ids = excluded.admin_ids",
+        (guild_id, cfg.category_id, cfg.admin_role_id,
+         None if cfg.admin_ids is None else ",".join(map(str, sorted(cfg.admin_ids))))
+    ))
+    guild_configs[guild_id] = cfg
+    return cfg
+
+# ─── REVOKED KEYS ─────────────────────────────────────────────────────────
+# key_ids of slot keys that were redeemed or revoked; checked on every ,Aslot
+revoked_keys: set[int] = set()
+
+async def _load_revoked_keys():
+    cur = await _reader.execute("SELECT key_id FROM revoked_keys")
+    revoked_keys.clear()
+    revoked_keys.update(row[0] for row in await cur.fetchall())
+
+@metrics.timed(metrics.DB_SECONDS, helper="revoke_key")
+async def revoke_key(key_id):
+    revoked_keys.add(key_id)
+    await _write((
+        "INSERT OR IGNORE INTO revoked_keys(key_id,revoked_at) VALUES(?,?)",
+        (key_id, datetime.utcnow().isoformat())
+    ))
+
+@metrics.timed(metrics.DB_SECONDS, helper="unrevoke_key")
+async def unrevoke_key(key_id):
+    """Make a key usable again, e.g. when restoring its slot failed."""
+    revoked_keys.discard(key_id)
+    await _write(("DELETE FROM revoked_keys WHERE key_id = ?", (key_id,)))
+
+# ─── PENDING DECISIONS ────────────────────────────────────────────────────
+# Written straight to the writer even in write-behind mode: resolving one
+# must see the row that opened it, and its rowcount decides who acts.
+class PendingAction:
+    """One row of `pending_actions`."""
+    __slots__ = ("id", "guild_id", "channel_id", "owner_id", "reason", "created_at",
+                 "deadline", "default_action", "resolved_at", "resolution", "resolved_by",
+                 "choice", "chosen_by")
+
+    def __init__(self, *fields):
+        for name, value in zip(self.__slots__, fields):
+            setattr(self, name, value)
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(*row)
+
+    def __repr__(self):
+        return f"<PendingAction channel_id={self.channel_id} default={self.default_action!r} resolution={self.resolution!r}>"
+
+@metrics.timed(metrics.DB_SECONDS, helper="open_pending_action")
+async def open_pending_action(guild_id, channel_id, owner_id, reason, default_action, deadline) -> bool:
+    """
+    Record a revoke awaiting a decision. A channel already awaiting one
+    keeps its row, and False is returned.
+    """
+    async with _write_lock:
+        cur = await _writer.execute(
+            "INSERT INTO pending_actions(guild_id,channel_id,owner_id,reason,created_at,deadline,default_action) "
+            "VALUES(?,?,?,?,?,?,?) ON CONFLICT(channel_id) WHERE resolved_at IS NULL DO NOTHING",
+            (guild_id, channel_id, owner_id, reason, datetime.utcnow().isoformat(),
+             deadline.isoformat(), default_action))
+        await _writer.commit()
+    return cur.rowcount == 1
+
+@metrics.timed(metrics.DB_SECONDS, helper="resolve_pending_action")
+async def resolve_pending_action(channel_id, resolution, resolved_by=None):
+    """
+    Close a channel's open decision and return it, or None if there was
+    none (already resolved by someone else, or by the sweeper, or already
+    chosen through choose_pending_action()). Only the caller that gets a
+    row back should act on it.
+    """
+    async with _write_lock:
+        cur = await _writer.execute(
+            "UPDATE pending_actions SET resolved_at = ?, resolution = ?, resolved_by = ? "
+            "WHERE channel_id = ? AND resolved_at IS NULL AND choice IS NULL RETURNING *",
+            (datetime.utcnow().isoformat(), resolution, resolved_by, channel_id))
+        row = await cur.fetchone()
+        await _writer.commit()
+    return PendingAction.from_row(row) if row else None
+
+@metrics.timed(metrics.DB_SECONDS, helper="choose_pending_action")
+async def choose_pending_action(channel_id, choice, chosen_by):
+    """
+    Record a decision on a channel's open row without closing it, for the
+    process owning the slot's guild to apply on its next sweep. Returns the
+    row, or None if it is closed or already has a choice.
+    """
+    async with _write_lock:
+        cur = await _writer.execute(
+            "UPDATE pending_actions SET choice = ?, chosen_by = ? "
+            "WHERE channel_id = ? AND resolved_at IS NULL AND choice IS NULL RETURNING *",
+            (choice, chosen_by, channel_id))
+        row = await cur.fetchone()
+        await _writer.commit()
+    return PendingAction.from_row(row) if row else None
+
+@metrics.timed(metrics.DB_SECONDS, helper="claim_due_pending_actions")
+async def claim_due_pending_actions(guild_ids, limit=100):
+    """
+    Resolve up to `limit` open decisions in `guild_ids` that were chosen
+    elsewhere (see choose_pending_action) or whose deadline has passed,
+    with the choice or else their default action, in one statement, and
+    return them.
+    """
+    now = datetime.utcnow().isoformat()
+    guilds = json.dumps(list(guild_ids))
+    async with _write_lock:
+        # two branches so each uses its own partial index
+        cur = await _writer.execute(
+            "UPDATE pending_actions SET resolved_at = ?, "
+            "  resolution = COALESCE(choice, default_action), resolved_by = chosen_by "
+            "WHERE id IN ("
+            "  SELECT id FROM pending_actions"
+            "  WHERE resolved_at IS NULL AND choice IS NOT NULL"
+            "    AND guild_id IN (SELECT value FROM json_each(?))"
+            "  UNION"
+            "  SELECT id FROM pending_actions"
+            "  WHERE resolved_at IS NULL AND deadline <= ?"
+            "    AND guild_id IN (SELECT value FROM json_each(?))"
+            "  LIMIT ?"
+            ") RETURNING *",
+            (now, guilds, now, guilds, limit))
+        rows = await cur.fetchall()
+        await _writer.commit()
+    return [PendingAction.from_row(row) for row in rows]
+
+# ─── PING COUNTERS ────────────────────────────────────────────────────────
+# Only the current UTC day is tracked: one `ping_counters` row per channel
+# and, in memory, channel_id -> count for `_ping_day`. Both are reset by the
+# midnight rollover, so neither grows with the number of days the bot runs.
+_ping_day = ""
+_ping_counts: dict[int, int] = {}
+_rollover_task: asyncio.Task | None = None
+
+# a row left over from an earlier day is simply overwritten
+_SET_PING_COUNT = (
+    "INSERT INTO ping_counters(channel_id,date_key,ping_count) VALUES(?,?,?) "
+    "ON CONFLICT(channel_id) DO UPDATE SET date_key = excluded.date_key, ping_count = excluded.ping_count"
+)
+
+def _today():
+    return datetime.utcnow().strftime("%Y-%m-%d")
+
+async def _load_ping_counts():
+    global _ping_day
+    _ping_day = _today()
+    _ping_counts.clear()
+    cur = await _reader.execute(
+        "SELECT channel_id, ping_count FROM ping_counters WHERE date_key = ?", (_ping_day,))
+    _ping_counts.update(await cur.fetchall())
+
+def _check_day():
+    """Start a fresh in-memory day if midnight passed before the rollover task ran."""
+    global _ping_day
+    today = _today()
+    if today != _ping_day:
+        _ping_day = today
+        _ping_counts.clear()
+
+async def _set_ping_count(channel_id, count):
+    _ping_counts[channel_id] = count
+    if WRITE_BEHIND:
+        _ping_dirty[channel_id] = (_ping_day, count)
+        _note_pending()
+    else:
+        await _write((_SET_PING_COUNT, (channel_id, _ping_day, count)))
+
+@metrics.timed(metrics.DB_SECONDS, helper="rollover_pings")
+async def rollover_pings():
+    """
+    Close out past days: archive their counters into `pings` if history is
+    kept, drop them from `ping_counters`, and prune history past
+    PING_HISTORY_DAYS.
+    """
+    _check_day()
+    await flush()
+    statements = []
+    if PING_HISTORY_DAYS > 0:
+        cutoff = (datetime.utcnow() - timedelta(days=PING_HISTORY_DAYS)).strftime("%Y-%m-%d")
+        statements.append(
+            ("INSERT INTO pings(channel_id,date_key,ping_count) "
+             "SELECT channel_id, date_key, ping_count FROM ping_counters WHERE date_key < ? "
+             "ON CONFLICT(channel_id,date_key) DO UPDATE SET ping_count = excluded.ping_count",
+             (_ping_day,)))
+    else:
+        # no history kept: this also clears rows written before ping_counters
+        cutoff = _ping_day
+    statements.append(("DELETE FROM pings WHERE date_key < ?", (cutoff,)))
+    statements.append(("DELETE FROM ping_counters WHERE date_key < ?", (_ping_day,)))
+    async with _write_lock:
+        for sql, params in statements:
+            await _writer.execute(sql, params)
+        await _writer.commit()
+
+async def _rollover():
+    while True:
+        now = datetime.utcnow()
+        midnight = datetime(now.year, now.month, now.day) + timedelta(days=1)
+        await asyncio.sleep((midnight - now).total_seconds())
+        try:
+            await asyncio.shield(rollover_pings())
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            log.exception("ping rollover failed; will retry at the next midnight")
+
+@metrics.timed(metrics.DB_SECONDS, helper="bump_ping")
+async def bump_ping(channel_id, n=1):
+    """Add `n` @here pings for today and return the channel's new count."""
+    _check_day()
+    # read and update with no await in between, so concurrent bumps can't collide
+    count = _ping_counts.get(channel_id, 0) + n
+    await _set_ping_count(channel_id, count)
+    return count
+
+def ping_count(channel_id):
+    """Today's @here count for a channel, without adding to it."""
+    _check_day()
+    return _ping_counts.get(channel_id, 0)
+
+@metrics.timed(metrics.DB_SECONDS, helper="seed_pings")
+async def seed_pings(channel_id, count):
+    """Set a channel's ping count for today (used when restoring a slot)."""
+    _check_day()
+    await _set_ping_count(channel_id, count)
+
+# ─── AUDIT LOG ────────────────────────────────────────────────────────────
+_event_buffer: list[tuple] = []
+_events_wanted = asyncio.Event()
+_events_task: asyncio.Task | None = None
+
+class SlotEvent:
+    """One row of `slot_events`."""
+    __slots__ = ("id", "at", "guild_id", "channel_id", "user_id", "actor_id", "kind", "detail")
+
+    def __init__(self, *fields):
+        for name, value in zip(self.__slots__, fields):
+            setattr(self, name, value)
+
+    @classmethod
+    def from_row(cls, row):
+        event_id, at, *rest = row
+        return cls(event_id, datetime.fromisoformat(at), *rest)
+
+    def __repr__(self):
+        return f"<SlotEvent {self.kind} channel_id={self.channel_id} user_id={self.user_id}>"
+
+def log_event(kind, guild_id=None, channel_id=None, user_id=None, actor_id=None, detail=None):
+    """
+    Queue an audit event. Doesn't touch the database: the buffer is
+    appended in batches by a background task, so callers never wait on it.
+    """
+    _event_buffer.append((datetime.utcnow().isoformat(), guild_id, channel_id, user_id, actor_id, kind, detail))
+    if len(_event_buffer) >= EVENT_BATCH:
+        _events_wanted.set()
+
+@metrics.timed(metrics.DB_SECONDS, helper="flush_events")
+async def flush_events():
+    """Append every buffered event in one transaction."""
+    if not _event_buffer:
+        return
+    batch = _event_buffer[:]
+    _event_buffer.clear()
+    async with _write_lock:
+        try:
+            await _writer.executemany(
+                "INSERT INTO slot_events(at,guild_id,channel_id,user_id,actor_id,kind,detail) "
+                "VALUES(?,?,?,?,?,?,?)", batch)
+            await _writer.commit()
+        except Exception:
+            await _writer.rollback()
+            _event_buffer[:0] = batch
+            raise
+
+async def _event_writer():
+    while True:
+        try:
+            await asyncio.wait_for(_events_wanted.wait(), EVENT_FLUSH_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        _events_wanted.clear()
+        try:
+            await asyncio.shield(flush_events())
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            log.exception("audit log append failed; will retry")
+
+@metrics.timed(metrics.DB_SECONDS, helper="get_events")
+async def get_events(guild_id, channel_id=None, user_id=None, before_id=None, limit=10):
+    """
+    A guild's events, newest first, optionally for one channel or user.
+    Pass the last id of a page as `before_id` to get the next one.
+    """
+    await flush_events()
+    where, params = ["guild_id = ?"], [guild_id]
+    if channel_id is not None:
+        where.append("channel_id = ?")
+        params.append(channel_id)
+    if user_id is not None:
+        where.append("user_id = ?")
+        params.append(user_id)
+    if len(where) > 1:
+        # unary + keeps the planner on the narrower channel/user index
+        where[0] = "+guild_id = ?"
+    if before_id is not None:
+        where.append("id < ?")
+        params.append(before_id)
+    cur = await _reader.execute(
+        f"SELECT * FROM slot_events WHERE {' AND '.join(where)} ORDER BY id DESC LIMIT ?",
+        (*params, limit))
+    return [SlotEvent.from_row(row) for row in await cur.fetchall()]
+
+# ─── HELPERS ──────────────────────────────────────────────────────────────
+@metrics.timed(metrics.DB_SECONDS, helper="add_slot")
 async def add_slot(guild_id, channel_id, user_id, name, days):
-    async with aiosqlite.connect(DB_FILE) as db:
-        await db.execute(
-            "INSERT INTO slots(guild_id,channel_id,user_id,slot_name,created_at,duration_days) "
-            "VALUES(?,?,?,?,?,?)",
-            (guild_id, channel_id, user_id, name, datetime.utcnow().isoformat(), days)
-        )
-        await db.commit()
+    created_at = datetime.utcnow()
+    cur = await _write((
+        "INSERT INTO slots(guild_id,channel_id,user_id,slot_name,created_at,duration_days) "
+        "VALUES(?,?,?,?,?,?)",
+        (guild_id, channel_id, user_id, name, created_at.isoformat(), days)
+    ))
+    # slot_id is only known once the row is written (None while queued)
+    rec = SlotRecord(cur.lastrowid if cur else None, guild_id, channel_id, user_id, name, created_at, days)
+    registry.put(rec)
+    return rec
 
+@metrics.timed(metrics.DB_SECONDS, helper="get_slot_by_channel")
 async def get_slot_by_channel(channel_id):
-    async with aiosqlite.connect(DB_FILE) as db:
-        cur = await db.execute("SELECT * FROM slots WHERE channel_id = ?", (channel_id,))
-        return await cur.fetchone()
+    """Return the SlotRecord for a channel, or None if it isn't a slot."""
+    return registry.get(channel_id)
+
+def _forget_pings(channel_ids):
+    for channel_id in channel_ids:
+        _ping_counts.pop(channel_id, None)
+        _ping_dirty.pop(channel_id, None)
 
+@metrics.timed(metrics.DB_SECONDS, helper="remove_slot")
 async def remove_slot(channel_id):
-    async with aiosqlite.connect(DB_FILE) as db:
-        await db.execute("DELETE FROM slots WHERE channel_id = ?", (channel_id,))
-        await db.execute("DELETE FROM pings WHERE channel_id = ?", (channel_id,))
-        await db.commit()
-
-async def bump_ping(channel_id, date_key):
-    async with aiosqlite.connect(DB_FILE) as db:
-        cur = await db.execute("SELECT ping_count FROM pings WHERE channel_id = ? AND date_key = ?",
-                               (channel_id, date_key))
-        row = await cur.fetchone()
-        if row:
-            new_count = row[0] + 1
-            await db.execute("UPDATE pings SET ping_count = ? WHERE channel_id = ? AND date_key = ?",
-                             (new_count, channel_id, date_key))
-        else:
-            new_count = 1
-            await db.execute("INSERT INTO pings(channel_id,date_key,ping_count) VALUES(?,?,?)",
-                             (channel_id, date_key, new_count))
-        await db.commit()
-        return new_count
+    _forget_pings({channel_id})
+    await _write(
+        ("DELETE FROM slots WHERE channel_id = ?", (channel_id,)),
+        ("DELETE FROM ping_counters WHERE channel_id = ?", (channel_id,)),
+        ("DELETE FROM pings WHERE channel_id = ?", (channel_id,)),
+        ("DELETE FROM slot_policies WHERE channel_id = ?", (channel_id,)),
+    )
+    registry.pop(channel_id)
+
+@metrics.timed(metrics.DB_SECONDS, helper="remove_slots")
+async def remove_slots(channel_ids):
+    """Remove many slots and their ping history in a single transaction."""
+    channel_ids = set(channel_ids)
+    if not channel_ids:
+        return
+    _forget_pings(channel_ids)
+    ids = (json.dumps(list(channel_ids)),)
+    await _write(
+        ("DELETE FROM slots WHERE channel_id IN (SELECT value FROM json_each(?))", ids),
+        ("DELETE FROM ping_counters WHERE channel_id IN (SELECT value FROM json_each(?))", ids),
+        ("DELETE FROM pings WHERE channel_id IN (SELECT value FROM json_each(?))", ids),
+        ("DELETE FROM slot_policies WHERE channel_id IN (SELECT value FROM json_each(?))", ids),
+    )
+    for channel_id in channel_ids:
+        registry.pop(channel_id)
 
+@metrics.timed(metrics.DB_SECONDS, helper="update_slot_owner")
 async def update_slot_owner(channel_id, new_user_id):
     """Transfer a slot to a new owner."""
-    async with aiosqlite.connect(DB_FILE) as db:
-        await db.execute(
-            "UPDATE slots SET user_id = ? WHERE channel_id = ?",
-            (new_user_id, channel_id))
-        await db.commit()
+    await _write(("UPDATE slots SET user_id = ? WHERE channel_id = ?", (new_user_id, channel_id)))
+    rec = registry.peek(channel_id)
+    if rec is not None:
+        rec.owner_id = new_user_id
+        registry.put(rec)
@@ -0,0 +1,186 @@
+import asyncio
+import logging
+import time
+import discord
+import metrics
+
+log = logging.getLogger(__name__)
+
+# Concurrent REST calls allowed across all routes.
+MAX_CONCURRENCY = 8
+# Attempts per action when Discord answers 429.
+MAX_ATTEMPTS = 3
+# (calls, per seconds) for each route; the bucket key is (route, major id)
+# like Discord's own buckets: messages, permission edits and channel deletes
+# are limited per channel, DMs per recipient. discord.py still applies the
+# real limits from response headers; these only keep our bursts under them.
+ROUTE_LIMITS = {
+    "dm":          (5, 5.0),
+    "message":     (5, 5.0),
+    "permissions": (5, 5.0),
+    "channel":     (5, 5.0),
+    "user":        (10, 1.0),
+    "member":      (10, 1.0),
+}
+DEFAULT_LIMIT = (5, 5.0)
+# Idle buckets are dropped once there are this many (one per DM recipient
+# and channel adds up).
+MAX_BUCKETS = 1024
+
+class RouteBucket:
+    """Token bucket for one route: at most `rate` calls every `per` seconds."""
+    __slots__ = ("rate", "per", "tokens", "updated", "blocked_until", "lock")
+
+    def __init__(self, rate, per):
+        self.rate = rate
+        self.per = per
+        self.tokens = float(rate)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate / self.per)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) * self.per / self.rate)
+
+    def idle(self, now):
+        """Refilled, unblocked and unused, so dropping it loses nothing."""
+        return (not self.lock.locked() and now >= self.blocked_until
+                and now - self.updated >= self.per)
+
+    def block(self, retry_after):
+        self.tokens = 0
+        self.blocked_until = time.monotonic() + retry_after
+
+class ActionDispatcher:
+    """
+    Central queue for outbound Discord REST actions.
+
+    Every action runs under a global concurrency limit and its route's
+    bucket, so independent actions (DMs to several admins, overwrites on
+    different members) go out in parallel without bursting into 429s.
+    Permission edits on the same (channel, target) that haven't started yet
+    are coalesced: only the latest one is sent and every caller gets its
+    result.
+    """
+
+    def __init__(self, max_concurrency=MAX_CONCURRENCY):
+        self._sem = asyncio.Semaphore(max_concurrency)
+        self._buckets: dict[tuple, RouteBucket] = {}
+        self._pending: dict[tuple, list] = {}
+        self.rate_limited = 0
+        self.coalesced = 0
+
+    def _bucket(self, route, major):
+        bucket = self._buckets.get((route, major))
+        if bucket is None:
+            if len(self._buckets) >= MAX_BUCKETS:
+                now = time.monotonic()
+                self._buckets = {k: b for k, b in self._buckets.items() if not b.idle(now)}
+            bucket = self._buckets[(route, major)] = RouteBucket(*ROUTE_LIMITS.get(route, DEFAULT_LIMIT))
+        return bucket
+
+    async def _run(self, route, major, entry, coalesce=None):
+        bucket = self._bucket(route, major)
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            await bucket.acquire()
+            async with self._sem:
+                if coalesce is not None and self._pending.get(coalesce) is entry:
+                    # from here on, new submits start a fresh action
+                    del self._pending[coalesce]
+                try:
+                    with metrics.timer(metrics.REST_SECONDS, route=route):
+                        return await entry[0]()
+                except discord.RateLimited as exc:
+                    retry_after = exc.retry_after
+                except discord.HTTPException as exc:
+                    if exc.status != 429:
+                        raise
+                    retry_after = getattr(exc, "retry_after", None) or 1.0
+            # already counted in metrics.RATE_LIMITED from discord.http's warning
+            self.rate_limited += 1
+            log.warning("429 on %s/%s, retrying in %.2fs", route, major, retry_after)
+            bucket.block(retry_after)
+            if attempt == MAX_ATTEMPTS:
+                raise discord.RateLimited(retry_after)
+
+    def submit(self, route, factory, *, major=None, coalesce=None) -> asyncio.Task:
+        """
+        Queue ``factory()`` (a coroutine function) on a route and return a
+        task for its result. Actions sharing a `coalesce` key collapse into
+        the most recently submitted one while still queued.
+        """
+        if coalesce is not None:
+            entry = self._pending.get(coalesce)
+            if entry is not None:
+                entry[0] = factory
+                self.coalesced += 1
+                return entry[1]
+            entry = self._pending[coalesce] = [factory, None]
+            entry[1] = asyncio.ensure_future(self._run(route, major, entry, coalesce))
+            return entry[1]
+        return asyncio.ensure_future(self._run(route, major, [factory]))
+
+    # ─── CONVENIENCE WRAPPERS ─────────────────────────────────────────────
+    def send(self, channel: discord.abc.Messageable, *args, **kwargs):
+        major = getattr(channel, "id", None)
+        return self.submit("message", lambda: channel.send(*args, **kwargs), major=major)
+
+    def dm(self, user: discord.abc.User, *args, **kwargs):
+        """DM a user; returns None instead of raising if their DMs are closed."""
+        async def send():
+            try:
+                return await user.send(*args, **kwargs)
+            except discord.Forbidden:
+                return None
+        return self.submit("dm", send, major=user.id)
+
+    def delete_messages(self, channel, messages, *, reason=None):
+        """Delete messages from one channel, up to 100 per bulk-delete call."""
+        async def delete():
+            for i in range(0, len(messages), 100):
+                await channel.delete_messages(messages[i:i + 100], reason=reason)
+        return self.submit("message", delete, major=channel.id)
+
+    def set_permissions(self, channel, target, *, overwrite=discord.utils.MISSING, reason=None, **perms):
+        if overwrite is discord.utils.MISSING:
+            factory = lambda: channel.set_permissions(target, reason=reason, **perms)
+        else:
+            factory = lambda: channel.set_permissions(target, overwrite=overwrite, reason=reason)
+        return self.submit("permissions", factory, major=channel.id,
+                           coalesce=("permissions", channel.id, target.id))
+
+    def delete_channel(self, channel, *, reason=None):
+        return self.submit("channel", lambda: channel.delete(reason=reason), major=channel.id)
+
+    def fetch_user(self, client: discord.Client, user_id: int):
+        return self.submit("user", lambda: client.fetch_user(user_id))
+
+    def fetch_member(self, guild: discord.Guild, user_id: int):
+        return self.submit("member", lambda: guild.fetch_member(user_id), major=guild.id)
+
+actions = ActionDispatcher()
+
+async def resolve_member(guild: discord.Guild, user_id: int) -> discord.Member | None:
+    """
+    Member from the cache, else fetched over REST. The slim member cache only
+    holds admins and slot owners, so this is the fallback for everyone else.
+    Returns None if they have left the guild.
+    """
+    member = guild.get_member(user_id)
+    if member is not None:
+        return member
+    try:
+        return await actions.fetch_member(guild, user_id)
+    except discord.NotFound:
+        return None
@@ -0,0 +1,122 @@
+"""
+Streaming exports of the slot tables for reporting.
+
+    python export.py slots --format csv --out slots.csv
+    python export.py revokes --format jsonl --guild 1234567890 > revokes.jsonl
+
+Rows are read CHUNK_SIZE at a time with fetchmany() on a read-only
+connection of their own, and each batch is encoded and written from a worker
+thread. Memory stays flat however large the table is, and the bot's event
+loop and shared reader are never held up. The admin `,export` command uses
+the same code.
+"""
+import argparse
+import asyncio
+import csv
+import io
+import json
+import sys
+import database as db
+
+CHUNK_SIZE = 500
+FORMATS = ("csv", "jsonl")
+
+# table name -> (query, WHERE clause limiting it to one guild)
+TABLES = {
+    "slots": (
+        "SELECT slot_id, guild_id, channel_id, user_id, slot_name, created_at, duration_days "
+        "FROM slots {where} ORDER BY slot_id",
+        "WHERE guild_id = ?",
+    ),
+    # archived days plus today's live counters
+    "pings": (
+        "SELECT s.guild_id, p.channel_id, p.date_key, p.ping_count FROM ("
+        "  SELECT channel_id, date_key, ping_count FROM pings h WHERE NOT EXISTS ("
+        "    SELECT 1 FROM ping_counters c WHERE c.channel_id = h.channel_id AND c.date_key = h.date_key)"
+        "  UNION ALL SELECT channel_id, date_key, ping_count FROM ping_counters"
+        ") p LEFT JOIN slots s ON s.channel_id = p.channel_id {where}",
+        "WHERE s.guild_id = ?",
+    ),
+    # every revoke: ping-limit ones with their Keep/Delete decision, plus
+    # those from ,revoke, /revoke, ,bulkrevoke and expiry (audit events)
+    "revokes": (
+        "SELECT * FROM ("
+        "  SELECT 'ping_limit' AS source, id, guild_id, channel_id, owner_id, NULL AS actor_id, "
+        "    reason, created_at, deadline, default_action, resolved_at, resolution, resolved_by "
+        "  FROM pending_actions"
+        "  UNION ALL"
+        "  SELECT CASE WHEN actor_id IS NULL THEN 'expiry' ELSE 'admin' END, id, guild_id, channel_id, "
+        "    user_id, actor_id, detail, at, NULL, NULL, NULL, NULL, NULL "
+        "  FROM slot_events WHERE kind = 'revoke'"
+        ") {where} ORDER BY created_at",
+        "WHERE guild_id = ?",
+    ),
+    "events": (
+        "SELECT id, at, guild_id, channel_id, user_id, actor_id, kind, detail "
+        "FROM slot_events {where} ORDER BY id",
+        "WHERE guild_id = ?",
+    ),
+}
+
+def _encode(fmt, columns, rows):
+    buf = io.StringIO()
+    if fmt == "csv":
+        csv.writer(buf).writerows(rows)
+    else:
+        for row in rows:
+            buf.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False))
+            buf.write("\n")
+    return buf.getvalue().encode()
+
+def _write_chunk(out, fmt, columns, rows):
+    out.write(_encode(fmt, columns, rows))
+
+async def export_table(conn, table, fmt, out, guild_id=None, chunk_size=CHUNK_SIZE) -> int:
+    """Stream `table` as `fmt` into the binary file `out`; returns the row count."""
+    sql, where = TABLES[table]
+    if guild_id is None:
+        sql, params = sql.format(where=""), ()
+    else:
+        sql, params = sql.format(where=where), (guild_id,)
+    cur = await conn.execute(sql, params)
+    columns = [d[0] for d in cur.description]
+    if fmt == "csv":
+        await asyncio.to_thread(_write_chunk, out, fmt, columns, [columns])
+    total = 0
+    try:
+        while rows := await cur.fetchmany(chunk_size):
+            await asyncio.to_thread(_write_chunk, out, fmt, columns, rows)
+            total += len(rows)
+    finally:
+        await cur.close()
+    return total
+
+async def export(table, fmt, out, guild_id=None) -> int:
+    """export_table() on a connection opened (and closed) just for this export."""
+    conn = await db.connect_readonly()
+    try:
+        return await export_table(conn, table, fmt, out, guild_id)
+    finally:
+        await conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("table", choices=TABLES)
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument("--out", default="-", help="output file (default: stdout)")
+    parser.add_argument("--guild", type=int, help="only this guild's rows")
+    parser.add_argument("--db", default=db.DB_FILE, help="database file")
+    args = parser.parse_args()
+    db.DB_FILE = args.db
+
+    async def run():
+        if args.out == "-":
+            return await export(args.table, args.format, sys.stdout.buffer, args.guild)
+        with open(args.out, "wb") as out:
+            return await export(args.table, args.format, out, args.guild)
+
+    rows = asyncio.run(run())
+    print(f"exported {rows} {args.table} rows", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import re
+import database as db
+
+# One pass over the text finds both kinds of mass mention.
+MENTION_PATTERN = re.compile(r"@(here|everyone)", re.IGNORECASE)
+HERE_PATTERN = re.compile(r"@here", re.IGNORECASE)
+
+class MentionScan:
+    """How many @here / @everyone mentions a message carries."""
+    __slots__ = ("here", "everyone")
+
+    def __init__(self, here=0, everyone=0):
+        self.here = here
+        self.everyone = everyone
+
+    def __bool__(self):
+        return bool(self.here or self.everyone)
+
+    def __repr__(self):
+        return f"<MentionScan here={self.here} everyone={self.everyone}>"
+
+NO_MENTIONS = MentionScan()
+
+def scan(content: str) -> MentionScan:
+    # `in` on a str is a C-level memchr, far cheaper than starting the regex
+    if "@" not in content:
+        return NO_MENTIONS
+    found = MENTION_PATTERN.findall(content)
+    if not found:
+        return NO_MENTIONS
+    here = sum(1 for word in found if word[0] in "hH")
+    return MentionScan(here, len(found) - here)
+
+def scan_message(message) -> MentionScan | None:
+    """
+    Classify a guild message for ping enforcement. Returns None for channels
+    that aren't slots, before any text is looked at.
+
+    `message.mention_everyone` (the gateway's own flag) isn't used as a
+    shortcut: it can't tell @here from @everyone and is False when the author
+    lacks the permission, while the slot rules apply to the text either way.
+    """
+    if message.channel.id not in db.registry:
+        return None
+    return scan(message.content)
+
+def strip_here(content: str) -> str:
+    return HERE_PATTERN.sub("", content)
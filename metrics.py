@@ -0,0 +1,164 @@
+import bisect
+import contextlib
+import functools
+import logging
+import os
+import time
+
+# Set METRICS_PORT to serve Prometheus text format on http://METRICS_HOST:PORT/metrics.
+# When it is unset every hook below compiles down to nothing: timed() hands
+# back the undecorated function and timer() a shared no-op context.
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+ENABLED = METRICS_PORT > 0
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_metrics = []
+
+def _fmt_labels(key):
+    if not key:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in key) + "}"
+
+class Counter:
+    def __init__(self, name, doc):
+        self.name, self.doc = name, doc
+        self.values: dict[tuple, float] = {}
+        _metrics.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.doc}"
+        yield f"# TYPE {self.name} counter"
+        for key, value in self.values.items():
+            yield f"{self.name}{_fmt_labels(key)} {value}"
+
+class Gauge:
+    """A value read at scrape time from `func()`."""
+
+    def __init__(self, name, doc, func=None):
+        self.name, self.doc, self.func = name, doc, func
+        _metrics.append(self)
+
+    def render(self):
+        if self.func is None:
+            return
+        yield f"# HELP {self.name} {self.doc}"
+        yield f"# TYPE {self.name} gauge"
+        yield f"{self.name} {float(self.func())}"
+
+class Histogram:
+    def __init__(self, name, doc, buckets=DEFAULT_BUCKETS):
+        self.name, self.doc = name, doc
+        self.buckets = buckets
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self.values: dict[tuple, list] = {}
+        _metrics.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        row = self.values.get(key)
+        if row is None:
+            row = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        row[bisect.bisect_left(self.buckets, value)] += 1
+        row[-1] += value
+
+    def render(self):
+        yield f"# HELP {self.name} {self.doc}"
+        yield f"# TYPE {self.name} histogram"
+        for key, row in self.values.items():
+            cumulative = 0
+            for bound, n in zip(self.buckets + ("+Inf",), row):
+                cumulative += n
+                yield f"{self.name}_bucket{_fmt_labels(key + (('le', bound),))} {cumulative}"
+            yield f"{self.name}_sum{_fmt_labels(key)} {row[-1]}"
+            yield f"{self.name}_count{_fmt_labels(key)} {cumulative}"
+
+# ─── METRICS ──────────────────────────────────────────────────────────────
+STAGE_SECONDS = Histogram("slotbot_stage_seconds", "Time spent per message-routing stage.")
+COMMAND_SECONDS = Histogram("slotbot_command_seconds", "Time to run each prefix command.")
+DB_SECONDS = Histogram("slotbot_db_seconds", "Time spent in each database.py helper.")
+REST_SECONDS = Histogram("slotbot_rest_seconds", "Time per Discord REST action, by dispatcher route.")
+REVOKE_SECONDS = Histogram("slotbot_hard_delete_seconds", "Time for AdminCog._hard_delete.")
+RATE_LIMITED = Counter("slotbot_discord_429_total", "Discord 429 responses, counted from discord.http's rate-limit warnings.")
+GATEWAY_LATENCY = Gauge("slotbot_gateway_latency_seconds", "Websocket heartbeat latency.")
+ACTIVE_SLOTS = Gauge("slotbot_active_slots", "Slots in the in-memory registry.")
+
+# ─── HOOKS ────────────────────────────────────────────────────────────────
+_NOOP = contextlib.nullcontext()
+
+@contextlib.contextmanager
+def _timer(hist, labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        hist.observe(time.perf_counter() - start, **labels)
+
+def timer(hist, **labels):
+    """`with timer(HIST, stage="x"):` - a no-op when metrics are disabled."""
+    if not ENABLED:
+        return _NOOP
+    return _timer(hist, labels)
+
+def timed(hist, **labels):
+    """Decorator timing an async function into `hist`; identity when disabled."""
+    def wrap(func):
+        if not ENABLED:
+            return func
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                hist.observe(time.perf_counter() - start, **labels)
+        return wrapper
+    return wrap
+
+class _RateLimitLog(logging.Handler):
+    """
+    Counts 429s into RATE_LIMITED. discord.py retries them inside
+    HTTPClient.request, so its warning records are the only place every
+    one of them shows up.
+    """
+
+    def emit(self, record):
+        # one per 429, global or not (a global one adds a second record)
+        if isinstance(record.msg, str) and record.msg.startswith("We are being rate limited."):
+            RATE_LIMITED.inc()
+
+_rate_limit_log = _RateLimitLog(logging.WARNING)
+
+def render() -> str:
+    return "\n".join(line for metric in _metrics for line in metric.render()) + "\n"
+
+# ─── HTTP ENDPOINT ────────────────────────────────────────────────────────
+_runner = None
+
+async def start_server():
+    global _runner
+    if not ENABLED or _runner is not None:
+        return
+    from aiohttp import web  # only pulled in when metrics are on
+
+    async def handle(request):
+        return web.Response(text=render(), content_type="text/plain", charset="utf-8")
+
+    logging.getLogger("discord.http").addHandler(_rate_limit_log)
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    _runner = web.AppRunner(app, access_log=None)
+    await _runner.setup()
+    await web.TCPSite(_runner, METRICS_HOST, METRICS_PORT).start()
+
+async def stop_server():
+    global _runner
+    if _runner is not None:
+        logging.getLogger("discord.http").removeHandler(_rate_limit_log)
+        await _runner.cleanup()
+        _runner = None
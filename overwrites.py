@@ -0,0 +1,51 @@
+import discord
+
+# Everyone can read a slot, only its owner and staff can post or mass-ping.
+EVERYONE_OVERWRITE = discord.PermissionOverwrite(view_channel=True, send_messages=False, mention_everyone=False)
+OWNER_OVERWRITE = discord.PermissionOverwrite(view_channel=True, send_messages=True, mention_everyone=True)
+STAFF_OVERWRITE = discord.PermissionOverwrite(view_channel=True, send_messages=True, mention_everyone=True)
+
+class OverwriteTemplates:
+    """
+    Per-guild cache of the overwrites every slot channel starts with
+    (@everyone, the bot, admins by ID and the admin role). Built on first
+    use; the bot drops a guild's entry when an admin or the admin role
+    changes, so slot creation never re-resolves members.
+
+    `settings(guild_id)` returns the guild's effective config (admin_ids,
+    admin_role_id).
+    """
+
+    def __init__(self, settings):
+        self.settings = settings
+        self._cache: dict[int, dict] = {}
+
+    def _build(self, guild: discord.Guild):
+        cfg = self.settings(guild.id)
+        base = {guild.default_role: EVERYONE_OVERWRITE, guild.me: STAFF_OVERWRITE}
+        for aid in cfg.admin_ids:
+            m = guild.get_member(aid)
+            if m:
+                base[m] = STAFF_OVERWRITE
+        role = guild.get_role(cfg.admin_role_id)
+        if role:
+            base[role] = STAFF_OVERWRITE
+        return base
+
+    def base(self, guild: discord.Guild):
+        base = self._cache.get(guild.id)
+        if base is None:
+            base = self._cache[guild.id] = self._build(guild)
+        return base
+
+    def for_owner(self, guild: discord.Guild, owner):
+        """Overwrites for a new slot channel owned by `owner`."""
+        overwrites = dict(self.base(guild))
+        overwrites[owner] = OWNER_OVERWRITE
+        return overwrites
+
+    def invalidate(self, guild_id=None):
+        if guild_id is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(guild_id, None)
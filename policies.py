@@ -0,0 +1,198 @@
+"""
+Per-slot ping policies, compiled.
+
+A slot's PingPolicy (database.py) is turned into a PingEvaluator the first
+time the slot pings, and cached on its SlotRecord until the policy changes.
+Rolling windows count pings in a TimestampRing, so a check costs the same
+for "3 per 24h" as for "1 per minute". Calendar-day @here counts use the
+persisted ping counters instead; rolling-window state is in memory only.
+"""
+import time
+from array import array
+import database as db
+
+# Verdicts for one mass mention
+ALLOW = "allow"          # let it through and count it
+LAST = "last"            # allowed, and the allowance is now used up
+COOLDOWN = "cooldown"    # within limits but too soon after the last one: counted, then deleted
+REVOKE = "revoke"        # over the limit
+
+# Window for @everyone allowances when the policy counts calendar days:
+# only @here has a persisted per-day counter.
+EVERYONE_DAY = 86400
+
+class Verdict:
+    __slots__ = ("action", "count", "limit", "retry_after")
+
+    def __init__(self, action, count=0, limit=0, retry_after=0.0):
+        self.action = action
+        self.count = count
+        self.limit = limit
+        self.retry_after = retry_after
+
+    def __repr__(self):
+        return f"<Verdict {self.action} {self.count}/{self.limit}>"
+
+class TimestampRing:
+    """
+    Timestamps of at most `capacity` recent events, oldest first, in a flat
+    array of doubles. Expired entries are dropped from the head, so each
+    event costs O(1) amortised whatever the window length.
+    """
+    __slots__ = ("_times", "_head", "_size")
+
+    def __init__(self, capacity):
+        self._times = array("d", bytes(8 * capacity))
+        self._head = 0
+        self._size = 0
+
+    def count(self, since):
+        """Events after `since`, dropping the older ones."""
+        times = self._times
+        while self._size and times[self._head] <= since:
+            self._head = (self._head + 1) % len(times)
+            self._size -= 1
+        return self._size
+
+    def push(self, t):
+        self._times[(self._head + self._size) % len(self._times)] = t
+        self._size += 1
+
+class PingEvaluator:
+    """
+    A PingPolicy compiled for one slot. The checks that apply are picked
+    once, here: calendar-day or rolling @here counting, @everyone allowed
+    or not, cooldown or not. Each ping then runs straight through them.
+    """
+    __slots__ = ("channel_id", "_check_here", "_check_everyone", "_here", "_everyone",
+                 "_here_limit", "_everyone_limit", "_here_window", "_everyone_window",
+                 "_cooldown", "_last", "_base", "_counted")
+
+    def __init__(self, policy: db.PingPolicy, channel_id: int):
+        self.channel_id = channel_id
+        self._here_limit = policy.here_limit
+        self._everyone_limit = policy.everyone_limit
+        self._here_window = policy.window
+        self._everyone_window = policy.window or EVERYONE_DAY
+        self._cooldown = policy.cooldown
+        self._last = float("-inf")
+        self._base = self._counted = 0
+
+        if policy.window:
+            self._here = TimestampRing(policy.here_limit)
+            self._check_here = self._here_rolling
+        else:
+            self._here = None
+            self._check_here = self._here_daily
+        if policy.everyone_limit:
+            self._everyone = TimestampRing(policy.everyone_limit)
+            self._check_everyone = self._everyone_rolling
+        else:
+            self._everyone = None
+            self._check_everyone = self._everyone_never
+
+    async def check(self, everyone: bool, now: float = None) -> Verdict:
+        """Judge one @everyone (or else @here) ping at monotonic time `now`."""
+        return (await self.check_burst([everyone], now))[0]
+
+    async def check_burst(self, pings: list[bool], now: float = None) -> list[Verdict]:
+        """
+        Judge pings sent together (True for @everyone, False for @here), in
+        order. Judging stops at the first REVOKE, so fewer verdicts than
+        pings may come back. Calendar-day @here counts are persisted with a
+        single bump for the whole burst.
+
+        Limits are checked before the cooldown, and a ping inside the
+        cooldown still uses up allowance: spamming through a cooldown ends
+        in a revoke like any other excess, and a forbidden @everyone always
+        revokes.
+        """
+        if now is None:
+            now = time.monotonic()
+        if self._here is None:
+            self._base, self._counted = db.ping_count(self.channel_id), 0
+        verdicts = []
+        for everyone in pings:
+            verdict = self._check_everyone(now) if everyone else self._check_here(now)
+            if verdict.action == REVOKE:
+                verdicts.append(verdict)
+                break
+            if self._cooldown and now - self._last < self._cooldown:
+                verdict = Verdict(COOLDOWN, verdict.count, verdict.limit, self._cooldown - (now - self._last))
+            else:
+                self._last = now
+            verdicts.append(verdict)
+        if self._here is None and self._counted:
+            await db.bump_ping(self.channel_id, self._counted)
+        return verdicts
+
+    # ----------------------------------------------------------
+    def _here_daily(self, now):
+        # the persisted per-day counter, so restarts and restores keep it
+        self._counted += 1
+        return _judge(self._base + self._counted, self._here_limit)
+
+    def _here_rolling(self, now):
+        return _take(self._here, now - self._here_window, now, self._here_limit)
+
+    def _everyone_rolling(self, now):
+        return _take(self._everyone, now - self._everyone_window, now, self._everyone_limit)
+
+    def _everyone_never(self, now):
+        return Verdict(REVOKE, 1, 0)
+
+def _judge(count, limit):
+    if count > limit:
+        return Verdict(REVOKE, count, limit)
+    return Verdict(LAST if count == limit else ALLOW, count, limit)
+
+def _take(ring, since, now, limit):
+    count = ring.count(since) + 1
+    if count <= limit:
+        ring.push(now)
+    return _judge(count, limit)
+
+def evaluator_for(rec: db.SlotRecord) -> PingEvaluator:
+    """The slot's compiled policy, built on first use and cached on the record."""
+    evaluator = rec.evaluator
+    if evaluator is None:
+        evaluator = rec.evaluator = PingEvaluator(rec.policy or db.DEFAULT_POLICY, rec.channel_id)
+    return evaluator
+
+def describe(policy: db.PingPolicy) -> str:
+    """`2 @here per day · no @everyone · 10m cooldown`"""
+    window = "per day" if not policy.window else f"per {format_duration(policy.window)}"
+    parts = [f"{policy.here_limit} @here {window}"]
+    if policy.everyone_limit:
+        parts.append(f"{policy.everyone_limit} @everyone {window if policy.window else 'per 24h'}")
+    else:
+        parts.append("no @everyone")
+    if policy.cooldown:
+        parts.append(f"{format_duration(policy.cooldown)} cooldown")
+    return " · ".join(parts)
+
+_UNITS = (("d", 86400), ("h", 3600), ("m", 60), ("s", 1))
+
+def format_duration(seconds: int) -> str:
+    for suffix, size in _UNITS:
+        if seconds % size == 0:
+            return f"{seconds // size}{suffix}"
+    return f"{seconds}s"
+
+def parse_duration(text: str) -> int:
+    """
+    `90`, `90s`, `10m`, `24h`, `2d` -> seconds; `day` -> 0 (calendar day).
+    Raises ValueError for anything else, negative values included.
+    """
+    text = text.strip().lower()
+    if text == "day":
+        return 0
+    for suffix, size in _UNITS:
+        if text.endswith(suffix):
+            seconds = int(text[:-1]) * size
+            break
+    else:
+        seconds = int(text)
+    if seconds < 0:
+        raise ValueError(f"negative duration: {text!r}")
+    return seconds
@@ -0,0 +1,75 @@
+import asyncio
+import logging
+import time
+import discord
+import database as db
+from dispatcher import actions, resolve_member
+from overwrites import OWNER_OVERWRITE
+
+log = logging.getLogger(__name__)
+
+class ReconcileReport:
+    """What one reconcile_guild() pass found and fixed."""
+    __slots__ = ("guild_id", "orphans", "restored", "unmanaged", "seconds")
+
+    def __init__(self, guild_id, orphans, restored, unmanaged, seconds):
+        self.guild_id = guild_id
+        self.orphans = orphans        # channel IDs whose slot rows were removed
+        self.restored = restored      # channel IDs whose owner overwrite was re-applied
+        self.unmanaged = unmanaged    # channel IDs in the slot category with no slot row
+        self.seconds = seconds
+
+    def __repr__(self):
+        return (f"<ReconcileReport guild_id={self.guild_id} orphans={len(self.orphans)} "
+                f"restored={len(self.restored)} unmanaged={len(self.unmanaged)}>")
+
+async def _restore_owner(channel: discord.TextChannel, owner_id: int) -> bool:
+    member = await resolve_member(channel.guild, owner_id)
+    if member is None:
+        log.warning("slot %s: owner %s has left the guild", channel.id, owner_id)
+        return False
+    try:
+        await actions.set_permissions(channel, member, overwrite=OWNER_OVERWRITE, reason="Slot reconciliation")
+    except discord.HTTPException:
+        log.exception("slot %s: could not restore the owner overwrite", channel.id)
+        return False
+    return True
+
+async def reconcile_guild(guild: discord.Guild, category_id: int) -> ReconcileReport:
+    """
+    Bring a guild's slot rows back in line with its channels after downtime.
+
+    Slot rows (from the registry, which init_db loads with one query) are
+    diffed against the guild's channel cache: rows for deleted channels are
+    removed in one transaction, slots whose owner has no overwrite at all
+    get OWNER_OVERWRITE back, and channels in the slot category without a
+    row are logged. Owners with a deny overwrite (revoked slots awaiting a
+    decision) are left alone.
+    """
+    started = time.perf_counter()
+    slots = {rec.channel_id: rec for rec in db.registry.for_guild(guild.id)}
+
+    orphans = [channel_id for channel_id in slots if guild.get_channel(channel_id) is None]
+    await db.remove_slots(orphans)
+
+    jobs, checked = [], []
+    for channel_id, rec in slots.items():
+        channel = guild.get_channel(channel_id)
+        if channel is None or any(target.id == rec.owner_id for target in channel.overwrites):
+            continue
+        jobs.append(_restore_owner(channel, rec.owner_id))
+        checked.append(channel_id)
+    results = await asyncio.gather(*jobs)
+    restored = [channel_id for channel_id, ok in zip(checked, results) if ok]
+
+    category = guild.get_channel(category_id)
+    unmanaged = []
+    if isinstance(category, discord.CategoryChannel):
+        unmanaged = [channel.id for channel in category.text_channels if channel.id not in slots]
+    for channel_id in unmanaged:
+        log.warning("guild %s: channel %s is in the slot category but is not a slot", guild.id, channel_id)
+
+    report = ReconcileReport(guild.id, orphans, restored, unmanaged, time.perf_counter() - started)
+    log.info("reconciled guild %s in %.3fs: %d orphan rows removed, %d owner overwrites restored, "
+             "%d unmanaged channels", guild.id, report.seconds, len(orphans), len(restored), len(unmanaged))
+    return report
@@ -0,0 +1,79 @@
+import asyncio
+import discord
+import database as db
+import metrics
+from sessions import sessions
+
+class MessageRouter:
+    """
+    Single entry point for guild and DM messages.
+
+    Answers to pending prompts go to their session, prefix messages go to
+    command processing, messages in slot channels go to ping enforcement,
+    and everything else is dropped after one dict lookup. Each stage counts what it saw and what it dropped.
+
+    Messages from a guild that is on hold (see hold()) wait until it is
+    released, so nothing is handled against half-reconciled state.
+    """
+
+    STAGES = ("filter", "sessions", "commands", "slots")
+
+    def __init__(self, bot, prefix: str):
+        self.bot = bot
+        self.prefix = prefix
+        self.seen = dict.fromkeys(self.STAGES, 0)
+        self.dropped = dict.fromkeys(self.STAGES, 0)
+        self._holds: dict[int, asyncio.Event] = {}
+
+    def hold(self, guild_id: int):
+        """Park this guild's messages until release(guild_id)."""
+        self._holds.setdefault(guild_id, asyncio.Event())
+
+    def release(self, guild_id: int):
+        gate = self._holds.pop(guild_id, None)
+        if gate is not None:
+            gate.set()
+
+    async def route(self, message: discord.Message):
+        self.seen["filter"] += 1
+        if message.author.bot:
+            self.dropped["filter"] += 1
+            return
+        if self._holds and message.guild is not None:
+            gate = self._holds.get(message.guild.id)
+            if gate is not None:
+                await gate.wait()
+
+        # an answer to a prompt is never run as a command
+        is_answer = sessions.feed(message)
+        if is_answer:
+            self.seen["sessions"] += 1
+        is_command = not is_answer and message.content.startswith(self.prefix)
+        # a command typed in a slot still goes through ping enforcement,
+        # otherwise ",x @here" would dodge the limit
+        is_slot = message.guild is not None and message.channel.id in db.registry
+        if not (is_command or is_slot):
+            if not is_answer:
+                self.dropped["filter"] += 1
+            return
+
+        if is_command:
+            self.seen["commands"] += 1
+            with metrics.timer(metrics.STAGE_SECONDS, stage="commands"):
+                ctx = await self.bot.get_context(message)
+                if ctx.command is None:
+                    self.dropped["commands"] += 1
+                else:
+                    with metrics.timer(metrics.COMMAND_SECONDS, command=ctx.command.qualified_name):
+                        await self.bot.invoke(ctx)
+
+        if is_slot:
+            self.seen["slots"] += 1
+            # queues the ping; PingListener times enforcement as stage="enforce"
+            with metrics.timer(metrics.STAGE_SECONDS, stage="slots"):
+                enforcer = self.bot.get_cog("PingListener")
+                if enforcer is None or not await enforcer.handle_message(message):
+                    self.dropped["slots"] += 1
+
+    def stats(self):
+        return {stage: {"seen": self.seen[stage], "dropped": self.dropped[stage]} for stage in self.STAGES}
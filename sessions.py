@@ -0,0 +1,117 @@
+import asyncio
+import math
+import discord
+
+# Prompt expiry granularity in seconds, and buckets per wheel turn. A prompt
+# with a 30 s timeout expires between 30 and 31 s after it was asked.
+TICK = 1.0
+WHEEL_SIZE = 64
+
+class TimerWheel:
+    """
+    Hashed timer wheel: schedule() and cancel() are O(1), and each tick only
+    looks at one bucket. Delays longer than a full turn wait out extra turns
+    via a per-entry rounds counter. The ticking task only runs while
+    something is scheduled.
+    """
+
+    def __init__(self, on_expire, tick=TICK, size=WHEEL_SIZE):
+        self.on_expire = on_expire
+        self.tick = tick
+        self.buckets: list[dict] = [{} for _ in range(size)]   # key -> rounds left
+        self.cursor = 0
+        self._where: dict = {}                                   # key -> bucket index
+        self._task = None
+
+    def __len__(self):
+        return len(self._where)
+
+    def schedule(self, key, delay):
+        self.cancel(key)
+        ticks = max(1, math.ceil(delay / self.tick))
+        index = (self.cursor + ticks) % len(self.buckets)
+        self.buckets[index][key] = (ticks - 1) // len(self.buckets)
+        self._where[key] = index
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def cancel(self, key):
+        index = self._where.pop(key, None)
+        if index is not None:
+            del self.buckets[index][key]
+
+    def _advance(self):
+        self.cursor = (self.cursor + 1) % len(self.buckets)
+        bucket = self.buckets[self.cursor]
+        due = [key for key, rounds in bucket.items() if rounds == 0]
+        for key in bucket:
+            bucket[key] -= 1
+        for key in due:
+            del bucket[key]
+            del self._where[key]
+            self.on_expire(key)
+
+    async def _run(self):
+        try:
+            while self._where:
+                await asyncio.sleep(self.tick)
+                self._advance()
+        finally:
+            self._task = None
+
+class SessionManager:
+    """
+    Pending conversational prompts, keyed by (user_id, channel_id).
+
+    Commands `await sessions.ask(...)` instead of bot.wait_for("message").
+    The router passes every message to feed(), and one dict lookup decides
+    whether it answers a prompt. No per-waiter predicate runs on unrelated
+    messages. Unanswered prompts time out on a TimerWheel.
+    """
+
+    def __init__(self):
+        self._waiting: dict[tuple[int, int], asyncio.Future] = {}
+        self._wheel = TimerWheel(self._expire)
+
+    def __len__(self):
+        return len(self._waiting)
+
+    async def ask(self, user_id: int, channel_id: int, timeout: float) -> discord.Message:
+        """
+        Wait for `user_id`'s next message in `channel_id`. Raises
+        asyncio.TimeoutError after `timeout` seconds. A newer prompt for the
+        same user and channel replaces this one, which is cancelled.
+        """
+        key = (user_id, channel_id)
+        previous = self._waiting.get(key)
+        if previous is not None:
+            previous.cancel()
+        future = self._waiting[key] = asyncio.get_running_loop().create_future()
+        self._wheel.schedule(key, timeout)
+        try:
+            return await future
+        finally:
+            if self._waiting.get(key) is future:
+                del self._waiting[key]
+                self._wheel.cancel(key)
+
+    def feed(self, message: discord.Message) -> bool:
+        """Deliver `message` to the prompt waiting on it; False if there was none."""
+        if not self._waiting:
+            return False
+        key = (message.author.id, message.channel.id)
+        future = self._waiting.pop(key, None)
+        if future is None:
+            return False
+        self._wheel.cancel(key)
+        if future.done():
+            return False
+        future.set_result(message)
+        return True
+
+    def _expire(self, key):
+        future = self._waiting.pop(key, None)
+        if future is not None and not future.done():
+            future.set_exception(asyncio.TimeoutError())
+
+sessions = SessionManager()
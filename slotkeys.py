@@ -0,0 +1,79 @@
+import base64
+import calendar
+import datetime
+import hashlib
+import hmac
+import os
+import secrets
+import struct
+
+# Layout of a v1 key, before base64url:
+#   version:u8 owner_id:u64 key_id:u32 expiration:u32 pings:u16 name_len:u8
+#   name:utf-8[name_len] mac:16 bytes (truncated HMAC-SHA256 of everything before it)
+KEY_VERSION = 1
+_HEADER = struct.Struct(">BQIIHB")
+MAC_SIZE = 16
+MAX_NAME = 100
+
+def _load_secret() -> bytes | None:
+    # No fallback: anything derived from the source would let anyone mint
+    # keys. Without a secret, keys are neither issued nor accepted.
+    secret = os.getenv("SLOT_KEY_SECRET")
+    return secret.encode() if secret else None
+
+SECRET = _load_secret()
+
+class InvalidKey(ValueError):
+    """The key is malformed, from an unknown version or has a bad signature."""
+
+def enabled() -> bool:
+    """True when SLOT_KEY_SECRET is set, so keys can be signed and checked."""
+    return SECRET is not None
+
+def _mac(body: bytes) -> bytes:
+    if SECRET is None:
+        raise RuntimeError("SLOT_KEY_SECRET is not set; slot keys are disabled")
+    return hmac.new(SECRET, body, hashlib.sha256).digest()[:MAC_SIZE]
+
+def encode_key(data: dict) -> str:
+    """
+    Pack and sign a slot key. `data` holds owner_id, channel_name,
+    expiration (naive UTC datetime) and pings; a random key_id is added
+    unless one is given, so single keys can be revoked.
+    """
+    name = data["channel_name"].encode()[:MAX_NAME]
+    key_id = data.get("key_id") or secrets.randbits(32)
+    body = _HEADER.pack(
+        KEY_VERSION,
+        data["owner_id"],
+        key_id,
+        calendar.timegm(data["expiration"].utctimetuple()),
+        min(data["pings"], 0xFFFF),
+        len(name),
+    ) + name
+    return base64.urlsafe_b64encode(body + _mac(body)).rstrip(b"=").decode()
+
+def decode_key(key: str) -> dict:
+    """Verify and unpack a key without touching the database; raises InvalidKey."""
+    try:
+        raw = base64.urlsafe_b64decode(key + "=" * (-len(key) % 4))
+    except (ValueError, TypeError):
+        raise InvalidKey("not base64") from None
+    if len(raw) < _HEADER.size + MAC_SIZE:
+        raise InvalidKey("too short")
+    body, mac = raw[:-MAC_SIZE], raw[-MAC_SIZE:]
+    if not hmac.compare_digest(mac, _mac(body)):
+        raise InvalidKey("bad signature")
+    version, owner_id, key_id, expiration, pings, name_len = _HEADER.unpack_from(body)
+    if version != KEY_VERSION:
+        raise InvalidKey(f"unknown key version {version}")
+    name = body[_HEADER.size:]
+    if len(name) != name_len:
+        raise InvalidKey("bad length")
+    return {
+        "owner_id":     owner_id,
+        "key_id":       key_id,
+        "channel_name": name.decode(errors="replace"),
+        "expiration":   datetime.datetime.utcfromtimestamp(expiration),
+        "pings":        pings,
+    }